@@ -0,0 +1,71 @@
+"""Compare the technology extraction engines on a recorded corpus.
+
+Usage (from the project root):
+    python -m benchmarks.extraction vacancies.csv --limit 20
+
+The corpus is a CSV file (plain or gzipped) written by the `CSVPipeline`.
+"""
+
+import argparse
+import csv
+from pathlib import Path
+from time import perf_counter
+
+from techtrendanalysis.matcher import TechnologyMatcher
+from techtrendanalysis.nlp import NLPEngine
+from techtrendanalysis.wrangler import ENGINES, Wrangler
+from techtrendscrape.pipelines import CSVPipeline
+
+
+def load_corpus(file: Path) -> list[str]:
+    with CSVPipeline.open_file(file) as csv_file:
+        return [item["description"] for item in csv.DictReader(csv_file)]
+
+
+def benchmark(
+    descriptions: list[str], engine: str, limit: int
+) -> dict[str, float | dict[str, int]]:
+    wrangler = Wrangler(descriptions, "Benchmark", engine=engine)
+    started = perf_counter()
+    statistics = wrangler.calculate_frequency_distribution(limit)
+    elapsed = perf_counter() - started
+    return {
+        "seconds": elapsed,
+        "docs_per_second": len(descriptions) / elapsed,
+        "chars_per_second": sum(map(len, descriptions)) / elapsed,
+        "technology_frequency": statistics.technology_frequency,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", type=Path)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    descriptions = load_corpus(args.corpus)
+    print(f"{len(descriptions)} descriptions from {args.corpus}")
+    # Exclude one-time loading from the measurements.
+    NLPEngine.warm_up()
+    TechnologyMatcher.get()
+    results = {}
+    for engine in ENGINES:
+        results[engine] = result = benchmark(descriptions, engine, args.limit)
+        print(
+            f"{engine:>8}: {result['seconds']:.2f} s, "
+            f"{result['docs_per_second']:.0f} docs/s, "
+            f"{result['chars_per_second']:.0f} chars/s"
+        )
+
+    top = {
+        engine: {name.lower() for name in result["technology_frequency"]}
+        for engine, result in results.items()
+    }
+    common = set.intersection(*top.values())
+    print(f"Top {args.limit} overlap: {len(common)}")
+    for engine in ENGINES:
+        print(f"Only {engine}: {', '.join(sorted(top[engine] - common))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Measure the throughput of the description clean-up.
+
+Usage (from the project root):
+    python -m benchmarks.normalization [vacancies.csv] --repeat 5
+
+Without a corpus, synthetic descriptions are generated.
+"""
+
+import argparse
+import re
+from pathlib import Path
+from random import Random
+from time import perf_counter
+
+from benchmarks.extraction import load_corpus
+from techtrendanalysis.normalizer import TextNormalizer
+
+FRAGMENTS = [
+    "We are looking for a <b>Senior Python Developer</b>.<br>",
+    "• 3+ years of experience with Django &amp; PostgreSQL<br>",
+    "- Knowledge of AWS, Docker and Kubernetes&nbsp;is a plus<br>",
+    "<p>Upper-Intermediate English</p>",
+    "Flexible schedule, remote work and &quot;no bureaucracy&quot;. ",
+]
+
+
+def synthetic_corpus(size: int, seed: int = 0) -> list[str]:
+    random = Random(seed)
+    return [
+        "".join(random.choices(FRAGMENTS, k=random.randint(10, 40)))
+        for _ in range(size)
+    ]
+
+
+def legacy_clean(text: str, extra_filters: set[str] = set()) -> str:
+    """The previous approach: build and compile the unescaped alternation
+    on every call. It neither strips tags nor decodes entities."""
+    to_filter = {"<br>", "<b>", "</b>", "• ", "- "}.union(extra_filters)
+    pattern = re.compile(rf"{'|'.join(to_filter)}", flags=re.IGNORECASE)
+    return re.sub(pattern, " ", text)
+
+
+def legacy_joined_clean(descriptions: list[str]) -> None:
+    legacy_clean(" ".join(descriptions))
+
+
+def legacy_streamed_clean(descriptions: list[str]) -> None:
+    for description in descriptions:
+        legacy_clean(description)
+
+
+def normalizer_clean(descriptions: list[str]) -> None:
+    for _ in TextNormalizer.get().stream(descriptions):
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", type=Path, nargs="?")
+    parser.add_argument("--size", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    descriptions = (
+        load_corpus(args.corpus)
+        if args.corpus
+        else synthetic_corpus(args.size)
+    )
+    chars = sum(map(len, descriptions))
+    print(f"{len(descriptions)} descriptions, {chars} chars")
+    for name, clean in [
+        ("legacy (joined)", legacy_joined_clean),
+        ("legacy (streamed)", legacy_streamed_clean),
+        ("normalizer (streamed)", normalizer_clean),
+    ]:
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = perf_counter()
+            clean(descriptions)
+            best = min(best, perf_counter() - started)
+        print(f"{name:>21}: {chars / best:,.0f} chars/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Measure the throughput of the listing page parsing.
+
+Usage (from the project root):
+    python -m benchmarks.parsing [page.html ...] --repeat 200
+
+Without pages, the saved fixtures of `benchmarks/fixtures` are parsed.
+"""
+
+import argparse
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+from scrapy import Selector
+from scrapy.http import HtmlResponse
+
+from database import VacancyItem
+from techtrendscrape.spiders.djinni import DjinniSpider
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+def load_pages(files: list[Path]) -> list[HtmlResponse]:
+    return [
+        HtmlResponse(
+            "https://djinni.co/jobs/?primary_keyword=Python",
+            body=file.read_bytes(),
+            encoding="utf-8",
+        )
+        for file in files
+    ]
+
+
+def legacy_parse_job_item(selector: Selector, category: str) -> VacancyItem:
+    """The previous approach: six CSS queries, `strptime` and a validated
+    model per job item."""
+    years_of_experience, company_type = 0, None
+    for job_info in selector.css(".job-list-item__job-info span::text"):
+        if experience := job_info.re(r"\b(\d+)\b"):
+            years_of_experience = int(experience[0])
+        if "Product" in job_info.get():
+            company_type = "Product"
+    statistics = selector.css("span.text-muted span.nobr .mr-2::attr(title)")
+    return VacancyItem(
+        source=DjinniSpider.name,
+        category=category,
+        company_name=selector.css("header a.mr-2::text").get().strip(),
+        company_type=company_type or "Outsource/staff",
+        description=selector.css(
+            ".job-list-item__description span::attr(data-original-text)"
+        ).get(),
+        years_of_experience=years_of_experience,
+        publication_date=datetime.strptime(
+            selector.css("span.text-muted span.mr-2.nobr::attr(title)").get(),
+            "%H:%M %d.%m.%Y",
+        ),
+        views=int(statistics[0].get().split()[0]),
+        applications=int(statistics[1].get().split()[0]),
+    )
+
+
+def legacy_parse(pages: list[HtmlResponse]) -> int:
+    return sum(
+        1
+        for page in pages
+        for job_item in page.css("ul .list-jobs__item")
+        if legacy_parse_job_item(job_item, "Python")
+    )
+
+
+def spider_parse(pages: list[HtmlResponse]) -> int:
+    spider = DjinniSpider()
+    return sum(len(spider._parse_job_items(page, "Python")) for page in pages)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", type=Path, nargs="*")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages or sorted(FIXTURES_DIR.glob("*.html")))
+    for page in pages:
+        page.selector  # Exclude the HTML parsing by lxml.
+    legacy, current = legacy_parse(pages), spider_parse(pages)
+    if legacy != current:
+        raise SystemExit(f"Parsed {current} items instead of {legacy}.")
+    print(f"{len(pages)} pages, {current} items")
+    for name, parse in [("legacy", legacy_parse), ("spider", spider_parse)]:
+        started = perf_counter()
+        for _ in range(args.repeat):
+            parse(pages)
+        elapsed = perf_counter() - started
+        print(f"{name:>6}: {current * args.repeat / elapsed:,.0f} items/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Check the import time of the entry points with `python -X importtime`.
+
+Usage (from the project root):
+    python -m benchmarks.startup --check
+
+Every entry point is imported in a fresh interpreter. Heavy dependencies
+must stay lazy: a crawl-only start must not import spaCy, pymongo or
+pyarrow and must stay within the time budget.
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from collections import Counter
+
+# Modules imported by an entry point, the modules it must not import and
+# its time budget in seconds.
+ENTRY_POINTS = {
+    "crawl": (
+        [
+            "techtrendscrape.settings",
+            "techtrendscrape.spiders.djinni",
+            "techtrendscrape.pipelines",
+            "techtrendscrape.extensions",
+            "techtrendscrape.crawler",
+        ],
+        ("spacy", "pymongo", "pyarrow"),
+        0.8,
+    ),
+    "cli": (
+        ["techtrendscrape.cli"],
+        ("spacy", "pymongo", "pyarrow"),
+        0.8,
+    ),
+    "wrangler": (
+        ["techtrendanalysis.wrangler"],
+        ("spacy", "pymongo", "pyarrow"),
+        0.5,
+    ),
+    "batch": (
+        ["techtrendanalysis.batch"],
+        ("spacy", "pymongo", "pyarrow"),
+        0.5,
+    ),
+}
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+\d+ \| +(\S+)")
+
+
+def import_times(modules: list[str]) -> tuple[float, Counter, set[str]]:
+    """Import the `modules` in a fresh interpreter and return the total
+    import time, the import time of each top-level package and the names
+    of all imported modules."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import {', '.join(modules)}",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total, packages, names = 0.0, Counter(), set()
+    for line in result.stderr.splitlines():
+        if match := IMPORT_TIME.match(line):
+            self_us, name = match.groups()
+            total += int(self_us) / 1e6
+            names.add(name)
+            packages[name.split(".")[0]] += int(self_us) / 1e6
+    return total, packages, names
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "entry_points", nargs="*", help=f"any of {', '.join(ENTRY_POINTS)}"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="imports per entry point, the fastest one is kept",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="exit with an error if an entry point is over its budget or "
+        "imports a lazy dependency",
+    )
+    args = parser.parse_args()
+    if unknown := set(args.entry_points) - set(ENTRY_POINTS):
+        parser.error(f"unknown entry points: {', '.join(sorted(unknown))}")
+
+    failures = []
+    for name in args.entry_points or ENTRY_POINTS:
+        modules, forbidden, budget = ENTRY_POINTS[name]
+        total, packages, names = min(
+            (import_times(modules) for _ in range(args.repeat)),
+            key=lambda result: result[0],
+        )
+        imported = [module for module in forbidden if module in names]
+        heaviest = ", ".join(
+            f"{package} {seconds:.3f}s"
+            for package, seconds in packages.most_common(4)
+        )
+        print(f"{name:<10} {total:.3f}s (budget {budget}s): {heaviest}")
+        if total > budget:
+            failures.append(f"{name} took {total:.3f}s")
+        if imported:
+            failures.append(f"{name} imported {', '.join(imported)}")
+    if failures and args.check:
+        sys.exit(f"Startup check failed: {'; '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
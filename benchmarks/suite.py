@@ -0,0 +1,351 @@
+"""Run the offline end-to-end benchmarks and compare them to the baselines.
+
+Usage (from the project root):
+    python -m benchmarks.suite --check
+    python -m benchmarks.suite --engine lexicon --save-baseline
+
+The saved listing pages are replayed through the spider, the vacancies are
+pushed through both pipelines into mongomock (or the MongoDB configured in
+`.env` with `--mongo env`) and the technologies are extracted from
+synthetic corpora. The MongoDB pipeline runs in a Twisted reactor, with
+its threaded flushes and backpressure, like in a crawl. Every stage runs
+in a fresh process, so that its peak RSS is measured on its own.
+
+The mongomock stage only checks that the pipeline works: its latency is
+the one of the emulation, so it is not compared with a baseline. The
+spaCy stages are keyed by the model, and without `--engine`, an engine
+without baselines is skipped. With `--check`, a stage without a baseline
+is an error.
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from random import Random
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from time import perf_counter
+from typing import Any, Callable
+
+from benchmarks.normalization import FRAGMENTS
+from benchmarks.parsing import FIXTURES_DIR, load_pages
+from database import VacancyItem
+from techtrendanalysis.instrumentation import peak_rss_mb
+from techtrendanalysis.nlp import NLPEngine
+from techtrendanalysis.wrangler import ENGINES, Wrangler
+from techtrendscrape.pipelines import CSVPipeline, MongoPipeline
+from techtrendscrape.spiders.djinni import DjinniSpider
+
+BASELINES_FILE = Path(__file__).parent / "baselines.json"
+DEFAULT_PAGES = 200
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+# Metrics where a lower value is better, the others are throughputs.
+LOWER_IS_BETTER = (
+    "peak_rss_mb",
+    "write_latency_mean_ms",
+    "write_latency_max_ms",
+)
+# Stages measuring a stand-in rather than the code, they are neither
+# compared with nor saved as baselines.
+UNGATED_STAGES = ("mongo_pipeline/mongomock/",)
+
+
+def use_mongomock() -> None:
+    """Connect the database templates to an in-memory MongoDB."""
+    import mongomock
+
+    from database import client as mongo_client
+
+    client = mongomock.MongoClient()
+    mongo_client.MongoClientSingleton = lambda **kwargs: client
+    os.environ.setdefault("IS_TEST", "true")
+
+
+def replay_pages(pages: int) -> tuple[list[VacancyItem], float]:
+    """Parse `pages` listing pages, cycling through the fixtures, and
+    return the vacancies (made unique per page) and the elapsed time."""
+    fixtures = load_pages(sorted(FIXTURES_DIR.glob("*.html")))
+    spider = DjinniSpider(categories="Python")
+    list(spider.start_requests())
+    items = []
+    started = perf_counter()
+    for number in range(pages):
+        response = fixtures[number % len(fixtures)]
+        # A copy, the selector of a parsed response is cached.
+        response = response.replace(body=response.body)
+        items.append(
+            [
+                result
+                for result in spider.parse(
+                    response, "Python", page=number + 1, last_page=pages
+                )
+                if isinstance(result, VacancyItem)
+            ]
+        )
+    elapsed = perf_counter() - started
+    unique_items = [
+        item.model_copy(
+            update={"company_name": f"{item.company_name} #{number}"}
+        )
+        for number, page_items in enumerate(items)
+        for item in page_items
+    ]
+    return unique_items, elapsed
+
+
+def spider_stage(pages: int) -> dict[str, float]:
+    items, elapsed = replay_pages(pages)
+    return {
+        "pages_per_second": pages / elapsed,
+        "items_per_second": len(items) / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def mongo_pipeline_stage(pages: int, mongo: str) -> dict[str, float]:
+    from scrapy.settings import Settings
+    from scrapy.statscollectors import MemoryStatsCollector
+    from twisted.internet import reactor
+    from twisted.internet.defer import Deferred, inlineCallbacks
+    from twisted.python.failure import Failure
+
+    if mongo == "mongomock":
+        use_mongomock()
+    items, _ = replay_pages(pages)
+    spider = DjinniSpider()
+    stats = MemoryStatsCollector(SimpleNamespace(settings=Settings()))
+    pipeline = MongoPipeline(stats=stats)
+    elapsed = 0.0
+
+    @inlineCallbacks
+    def crawl() -> Any:
+        # Like Scrapy, wait for the items held back by the backpressure
+        # and for the remaining writes when the spider closes.
+        nonlocal elapsed
+        started = perf_counter()
+        pipeline.open_spider(spider)
+        for item in items:
+            result = pipeline.process_item(item, spider)
+            if isinstance(result, Deferred):
+                yield result
+        yield pipeline.close_spider(spider)
+        elapsed = perf_counter() - started
+
+    outcome = []
+    reactor.callWhenRunning(
+        lambda: crawl()
+        .addBoth(outcome.append)
+        .addBoth(lambda _: reactor.stop())
+    )
+    reactor.run(installSignalHandlers=False)
+    if isinstance(outcome[0], Failure):
+        outcome[0].raiseException()
+    if stats.get_value("mongo_pipeline/failed_flushes"):
+        raise RuntimeError("Failed to write the vacancies to MongoDB.")
+    return {
+        "items_per_second": len(items) / elapsed,
+        "write_latency_mean_ms": stats.get_value(
+            "mongo_pipeline/flush_latency_total"
+        )
+        / stats.get_value("mongo_pipeline/flushes")
+        * 1000,
+        "write_latency_max_ms": stats.get_value(
+            "mongo_pipeline/flush_latency_max"
+        )
+        * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def csv_pipeline_stage(
+    pages: int, compression: str | None
+) -> dict[str, float]:
+    items, _ = replay_pages(pages)
+    spider = DjinniSpider()
+    with TemporaryDirectory() as directory:
+        os.chdir(directory)
+        pipeline = CSVPipeline(compression=compression)
+        started = perf_counter()
+        pipeline.open_spider(spider)
+        for item in items:
+            pipeline.process_item(item, spider)
+        pipeline.close_spider(spider)
+        elapsed = perf_counter() - started
+    return {
+        "items_per_second": len(items) / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def synthetic_corpus(size: int, seed: int = 0) -> list[str]:
+    """Descriptions mixing the fixture descriptions with the fragments of
+    the normalization benchmark."""
+    items, _ = replay_pages(1)
+    fragments = [item.description for item in items] + FRAGMENTS
+    random = Random(seed)
+    return [
+        " ".join(random.choices(fragments, k=random.randint(2, 6)))
+        for _ in range(size)
+    ]
+
+
+def wrangler_stage(size: int, engine: str) -> dict[str, float]:
+    descriptions = synthetic_corpus(size)
+    tokens = sum(len(description.split()) for description in descriptions)
+    wrangler = Wrangler(descriptions, "Benchmark", engine=engine)
+    started = perf_counter()
+    wrangler.calculate_frequency_distribution()
+    elapsed = perf_counter() - started
+    return {
+        "docs_per_second": size / elapsed,
+        "tokens_per_second": tokens / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def wrangler_stage_name(engine: str, size: int) -> str:
+    """The spaCy throughput depends on the model, so it is part of the
+    name of the propn stages."""
+    if engine == "propn":
+        return f"wrangler/propn/{Path(NLPEngine.default_model()).name}/{size}"
+    return f"wrangler/{engine}/{size}"
+
+
+def run_isolated(stage: Callable[..., dict[str, float]], *args: Any) -> Any:
+    """Run the `stage` in a fresh process, so it has its own peak RSS."""
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(stage, *args).result()
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baselines: dict[str, dict[str, float]],
+    tolerance: float,
+) -> tuple[list[str], list[str]]:
+    """Print the results next to the baselines and return the metrics
+    that regressed by more than the `tolerance` and the gated stages
+    without a baseline."""
+    regressions, missing = [], []
+    for stage, metrics in results.items():
+        gated = not stage.startswith(UNGATED_STAGES)
+        for metric, value in metrics.items():
+            baseline = baselines.get(stage, {}).get(metric)
+            if baseline is None or not gated:
+                if gated and stage not in missing:
+                    missing.append(stage)
+                note = "no baseline" if gated else "not compared"
+                print(f"{stage:<30} {metric:<22} {value:>14,.1f} {note:>22}")
+                continue
+            change = value / baseline - 1
+            regressed = (
+                change > tolerance
+                if metric in LOWER_IS_BETTER
+                else change < -tolerance
+            )
+            if regressed:
+                regressions.append(f"{stage} {metric}")
+            print(
+                f"{stage:<30} {metric:<22} {value:>14,.1f} "
+                f"{baseline:>14,.1f} {change:>+7.0%}"
+                + (" REGRESSION" if regressed else "")
+            )
+    return regressions, missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=DEFAULT_PAGES)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--engine", choices=ENGINES, action="append", dest="engines"
+    )
+    parser.add_argument(
+        "--mongo", choices=("mongomock", "env"), default="mongomock"
+    )
+    parser.add_argument("--baselines", type=Path, default=BASELINES_FILE)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="relative change reported as a regression",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="exit with an error if a metric regressed",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the results as the new baselines",
+    )
+    args = parser.parse_args()
+
+    baselines = (
+        json.loads(args.baselines.read_text())
+        if args.baselines.exists()
+        else {}
+    )
+    # Without --engine, only the engines with baselines (e.g. not spaCy
+    # without a model baseline) are run.
+    engines = args.engines or [
+        engine
+        for engine in ENGINES
+        if any(
+            wrangler_stage_name(engine, size) in baselines
+            for size in args.sizes
+        )
+    ]
+    for engine in set(ENGINES) - set(engines):
+        print(f"Skipped the {engine} engine, select it with --engine {engine}")
+
+    # Stages are keyed by their parameters, which the metrics depend on.
+    pages = args.pages
+    results = {
+        f"spider/{pages}": run_isolated(spider_stage, pages),
+        f"mongo_pipeline/{args.mongo}/{pages}": run_isolated(
+            mongo_pipeline_stage, pages, args.mongo
+        ),
+        f"csv_pipeline/{pages}": run_isolated(csv_pipeline_stage, pages, None),
+        f"csv_pipeline/gzip/{pages}": run_isolated(
+            csv_pipeline_stage, pages, "gzip"
+        ),
+    }
+    for engine in engines:
+        for size in args.sizes:
+            results[wrangler_stage_name(engine, size)] = run_isolated(
+                wrangler_stage, size, engine
+            )
+
+    regressions, missing = compare(results, baselines, args.tolerance)
+    if args.save_baseline:
+        results = {
+            stage: {
+                metric: round(value, 1) for metric, value in metrics.items()
+            }
+            for stage, metrics in results.items()
+            if not stage.startswith(UNGATED_STAGES)
+        }
+        args.baselines.write_text(
+            json.dumps(baselines | results, indent=2) + "\n"
+        )
+        print(f"Baselines saved to {args.baselines}")
+        missing = []
+    if args.check and (regressions or missing):
+        failures = []
+        if regressions:
+            failures.append(f"Regressions: {', '.join(regressions)}")
+        if missing:
+            failures.append(
+                f"No baselines (record them with --save-baseline): "
+                f"{', '.join(missing)}"
+            )
+        sys.exit("; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
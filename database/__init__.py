@@ -1,3 +1,38 @@
-from .client import MongoClientSingleton
-from .models import Statistics, VacancyItem
-from .templates import DatabaseStatistics, DatabaseVacancies
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+from .environment import load_environment
+from .models import (
+    NewestVacancies,
+    Statistics,
+    TechnologyCount,
+    TechnologyRollup,
+    VacancyItem,
+    VacancyTechnologies,
+)
+from .parquet import ParquetStatistics, ParquetVacancies
+
+if TYPE_CHECKING:
+    from .client import MongoClientSingleton
+    from .templates import (
+        DatabaseStatistics,
+        DatabaseTechnologyRollups,
+        DatabaseVacancies,
+    )
+
+# The MongoDB backend is imported on first access, so the CSV and Parquet
+# paths don't pay for pymongo.
+_lazy_attributes = {
+    "MongoClientSingleton": ".client",
+    "DatabaseStatistics": ".templates",
+    "DatabaseTechnologyRollups": ".templates",
+    "DatabaseVacancies": ".templates",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _lazy_attributes:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_lazy_attributes[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -1,15 +1,18 @@
+import atexit
 from typing import Any
 
-from dotenv import load_dotenv
 from pymongo import MongoClient
 
-load_dotenv()
-
 
 class MongoClientSingleton(MongoClient):
-    """Singleton class for MongoDB connection using MongoClient."""
+    """Singleton class for MongoDB connection using MongoClient.
+
+    The client (and its connection pool) lives as long as the process,
+    it is closed automatically at exit.
+    """
 
     _instance = None
+    _initialized = False
 
     def __init__(
         self,
@@ -21,7 +24,11 @@ class MongoClientSingleton(MongoClient):
         """
         Connect to a local MongoDB if `is_test` is `True`.
         Otherwise, connect to a Mongo cloud.
+
+        The arguments are ignored if the client is already connected.
         """
+        if self._initialized:
+            return
         if not is_test:
             self._validate_production_params(
                 cluster_host=cluster_host, **kwargs
@@ -34,6 +41,8 @@ class MongoClientSingleton(MongoClient):
         else:
             client_kwargs = kwargs
         super().__init__(**client_kwargs)
+        self._initialized = True
+        atexit.register(self.close)
 
     def __new__(cls, **kwargs: Any) -> "MongoClientSingleton":
         """
@@ -59,5 +68,6 @@ class MongoClientSingleton(MongoClient):
 
     def close(self) -> None:
         """Close the MongoDB connection and reset the instance."""
-        self._instance = None
+        type(self)._instance = None
+        atexit.unregister(self.close)
         return super().close()
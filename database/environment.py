@@ -0,0 +1,10 @@
+from functools import cache
+
+from dotenv import load_dotenv
+
+
+@cache
+def load_environment() -> None:
+    """Load the variables of the `.env` file once, when a setting is first
+    needed, instead of as a side effect of importing the package."""
+    load_dotenv()
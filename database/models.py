@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Literal
 
-from pydantic import BaseModel, Field, NonNegativeInt
+from pydantic import BaseModel, Field, NonNegativeInt, PositiveInt
 
 
 class VacancyItem(BaseModel):
@@ -21,3 +21,60 @@ class Statistics(BaseModel):
     from_datetime: datetime
     to_datetime: datetime
     technology_frequency: dict[str, int]
+
+
+class TechnologyCount(BaseModel):
+    name: str = Field(min_length=1)  # Lowercased technology name.
+    text: str = Field(min_length=1)  # Spelling as found in the description.
+    count: PositiveInt
+
+
+class VacancyTechnologies(BaseModel):
+    """Technologies extracted from a single vacancy description."""
+
+    publication_date: datetime
+    company_name: str = Field(min_length=1)
+    years_of_experience: NonNegativeInt
+    description_hash: str
+    # Fingerprint of the extraction settings alone (engine, model,
+    # stopwords, filters), to tell apart technologies extracted by others.
+    extraction_fingerprint: str
+    technologies: list[TechnologyCount]
+
+
+class NewestVacancies(BaseModel):
+    """The newest stored vacancies of a category, where a delta crawl
+    stops: their publication date and the (company name, years of
+    experience) keys of the ones published then."""
+
+    publication_date: datetime
+    keys: set[tuple[str, int]] = set()
+
+    def add(self, publication_date: datetime, key: tuple[str, int]) -> None:
+        """Add a stored vacancy, keeping only the newest ones."""
+        if publication_date > self.publication_date:
+            self.publication_date, self.keys = publication_date, set()
+        if publication_date == self.publication_date:
+            self.keys.add(key)
+
+    def is_known(self, item: VacancyItem) -> bool:
+        """Whether the vacancy is older than the newest ones or one of
+        them. Dates have minute precision, so a vacancy of the same minute
+        may be new."""
+        if item.publication_date != self.publication_date:
+            return item.publication_date < self.publication_date
+        return (item.company_name, item.years_of_experience) in self.keys
+
+
+class TechnologyRollup(BaseModel):
+    """Mentions of a technology in the vacancies of a category published
+    within a day or a week (starting on Monday, UTC), as extracted with
+    the settings of the `extraction_fingerprint`."""
+
+    category: str = Field(min_length=1)
+    extraction_fingerprint: str
+    granularity: Literal["day", "week"]
+    bucket: datetime  # Start of the day or week.
+    name: str = Field(min_length=1)  # Lowercased technology name.
+    text: str = Field(min_length=1)
+    count: PositiveInt
@@ -0,0 +1,269 @@
+from abc import ABC, abstractmethod
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+from uuid import uuid4
+
+from pydantic import BaseModel
+
+from database.models import NewestVacancies, Statistics
+
+
+def _pyarrow() -> Any:
+    """Import pyarrow, an optional dependency of the Parquet storage."""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError(
+            "The Parquet storage requires pyarrow: pip install pyarrow"
+        ) from error
+    return pyarrow
+
+
+class ParquetDataset(ABC):
+    """Parquet dataset template for inheritance.
+
+    Rows are partitioned by category and month of the `date_field`
+    (`<directory>/category=<category>/month=<YYYY-MM>/*.parquet`), so a
+    scan of a category and window only opens the files of its months and
+    reads only the requested columns.
+    """
+
+    directory: str
+    date_field: str
+
+    def __init__(self, root: str | Path = ".") -> None:
+        self.path = Path(root, self.directory)
+
+    @classmethod
+    @abstractmethod
+    def schema(cls) -> Any:
+        """Schema of the rows, without the `month` partition column."""
+
+    def partition(self, item: BaseModel) -> tuple[str, str]:
+        """The (category, month) partition the `item` is written to."""
+        date = getattr(item, self.date_field)
+        if date.tzinfo is not None:
+            date = date.astimezone(UTC)
+        return item.category, f"{date:%Y-%m}"
+
+    def _partitioning(self) -> Any:
+        pa = _pyarrow()
+        return pa.dataset.partitioning(
+            pa.schema([("category", pa.string()), ("month", pa.string())]),
+            flavor="hive",
+        )
+
+    def write(self, items: list[BaseModel], *, replace: bool = False) -> None:
+        """Append the `items` as new files of their partitions. With
+        `replace`, the existing files of those partitions are deleted."""
+        if not items:
+            return
+        pa = _pyarrow()
+        table = pa.Table.from_pylist(
+            [item.model_dump() for item in items], schema=self.schema()
+        )
+        table = table.append_column(
+            "month",
+            pa.compute.strftime(table[self.date_field], format="%Y-%m"),
+        )
+        pa.parquet.write_to_dataset(
+            table,
+            self.path,
+            partitioning=self._partitioning(),
+            basename_template=f"part-{uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior=(
+                "delete_matching" if replace else "overwrite_or_ignore"
+            ),
+        )
+
+    def _filter(
+        self,
+        category: str | Iterable[str] | None,
+        from_datetime: timedelta | None,
+        to_datetime: timedelta | None,
+    ) -> Any:
+        """Expression matching the rows of the `category` (or of any of
+        several categories) within the window, pruning the partitions of
+        the other categories and months."""
+        field = _pyarrow().dataset.field
+        expressions = []
+        if isinstance(category, str):
+            expressions.append(field("category") == category)
+        elif category is not None:
+            expressions.append(field("category").isin(list(category)))
+        now = datetime.now(UTC)
+        if from_datetime is not None:
+            start = now - from_datetime
+            expressions.append(field("month") >= f"{start:%Y-%m}")
+            expressions.append(field(self.date_field) >= start)
+        if to_datetime is not None:
+            end = now - to_datetime
+            expressions.append(field("month") <= f"{end:%Y-%m}")
+            expressions.append(field(self.date_field) <= end)
+        expression = None
+        for item in expressions:
+            expression = item if expression is None else expression & item
+        return expression
+
+    def iter_rows(
+        self,
+        columns: Iterable[str],
+        category: str | Iterable[str] | None = None,
+        from_datetime: timedelta | None = None,
+        to_datetime: timedelta | None = None,
+        batch_size: int = 10_000,
+    ) -> Iterator[dict[str, Any]]:
+        """Lazily yield the matching rows with only the `columns`."""
+        if not self.path.exists():
+            return
+        pa = _pyarrow()
+        dataset = pa.dataset.dataset(
+            self.path,
+            schema=self.schema().append(pa.field("month", pa.string())),
+            format="parquet",
+            partitioning=self._partitioning(),
+        )
+        for batch in dataset.to_batches(
+            columns=list(columns),
+            filter=self._filter(category, from_datetime, to_datetime),
+            batch_size=batch_size,
+        ):
+            yield from batch.to_pylist()
+
+
+class ParquetVacancies(ParquetDataset):
+    """The Parquet counterpart of `DatabaseVacancies`."""
+
+    directory = "vacancies"
+    date_field = "publication_date"
+
+    @classmethod
+    def schema(cls) -> Any:
+        pa = _pyarrow()
+        return pa.schema(
+            [
+                ("source", pa.string()),
+                ("category", pa.string()),
+                ("company_name", pa.string()),
+                ("company_type", pa.string()),
+                ("description", pa.string()),
+                ("years_of_experience", pa.int64()),
+                ("publication_date", pa.timestamp("us", tz="UTC")),
+                ("views", pa.int64()),
+                ("applications", pa.int64()),
+            ]
+        )
+
+    def iter_vacancies(
+        self,
+        category: str | Iterable[str],
+        from_datetime: timedelta | None = None,
+        to_datetime: timedelta | None = None,
+        fields: Iterable[str] = ("description",),
+    ) -> Iterator[dict[str, Any]]:
+        """Lazily yield the vacancies of the window (all of them by
+        default) with only the requested `fields`."""
+        return self.iter_rows(fields, category, from_datetime, to_datetime)
+
+    def newest_vacancies(
+        self, categories: Iterable[str]
+    ) -> dict[str, NewestVacancies]:
+        """The newest stored vacancies per category, with naive (UTC)
+        dates like the ones parsed by the spider."""
+        newest: dict[str, NewestVacancies] = {}
+        for row in self.iter_rows(
+            [
+                "category",
+                "publication_date",
+                "company_name",
+                "years_of_experience",
+            ],
+            list(categories),
+        ):
+            date = row["publication_date"].replace(tzinfo=None)
+            newest.setdefault(
+                row["category"], NewestVacancies(publication_date=date)
+            ).add(date, (row["company_name"], row["years_of_experience"]))
+        return newest
+
+
+class ParquetStatistics(ParquetDataset):
+    """The Parquet counterpart of `DatabaseStatistics`, partitioned by the
+    month of `to_datetime`."""
+
+    directory = "statistics"
+    date_field = "to_datetime"
+
+    @classmethod
+    def schema(cls) -> Any:
+        pa = _pyarrow()
+        return pa.schema(
+            [
+                ("category", pa.string()),
+                ("from_datetime", pa.timestamp("us", tz="UTC")),
+                ("to_datetime", pa.timestamp("us", tz="UTC")),
+                (
+                    "technology_frequency",
+                    pa.map_(pa.string(), pa.int64()),
+                ),
+            ]
+        )
+
+    @staticmethod
+    def _window(statistics: Statistics) -> tuple[str, datetime, datetime]:
+        return (
+            statistics.category,
+            *(
+                (
+                    date.replace(tzinfo=UTC)
+                    if date.tzinfo is None
+                    else date.astimezone(UTC)
+                )
+                for date in (statistics.from_datetime, statistics.to_datetime)
+            ),
+        )
+
+    def write(self, items: list[Statistics], *, replace: bool = False) -> None:
+        """Store the `items`, replacing the stored statistics of the same
+        category and window, as `DatabaseStatistics` does. With `replace`,
+        the other statistics of their partitions are deleted too."""
+        # The last statistics of a window win, as with repeated upserts.
+        items = list({self._window(item): item for item in items}.values())
+        partitions = {self.partition(item) for item in items}
+        windows = {self._window(item) for item in items}
+        kept = []
+        if not replace:
+            kept = [
+                statistics
+                for statistics in self.iter_statistics(
+                    {category for category, _ in partitions}
+                )
+                if self.partition(statistics) in partitions
+                and self._window(statistics) not in windows
+            ]
+        # The partitions are rewritten with the statistics kept.
+        super().write(kept + items, replace=True)
+
+    def iter_statistics(
+        self, category: str | Iterable[str] | None = None
+    ) -> Iterator[Statistics]:
+        for row in self.iter_rows(self.schema().names, category):
+            # Maps are read as lists of key-value pairs.
+            row["technology_frequency"] = dict(row["technology_frequency"])
+            yield Statistics(**row)
+
+    def latest_statistics(self, category: str) -> Statistics | None:
+        """Return the most recent statistics of the `category`, the widest
+        window of the ones ending then."""
+        return min(
+            self.iter_statistics(category),
+            key=lambda statistics: (
+                -statistics.to_datetime.timestamp(),
+                statistics.from_datetime,
+            ),
+            default=None,
+        )
@@ -1,27 +1,69 @@
 from datetime import UTC, datetime, timedelta
 from os import environ, getenv
-from typing import Any
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
 
 from pydantic import BaseModel
-from pymongo import ASCENDING, DESCENDING, ReplaceOne
-from pymongo.collection import Collection
 
-from database.client import MongoClientSingleton
+from database.environment import load_environment
+from database.models import (
+    NewestVacancies,
+    Statistics,
+    TechnologyRollup,
+    VacancyTechnologies,
+)
+
+if TYPE_CHECKING:
+    from pymongo import ReplaceOne, UpdateOne
+    from pymongo.collection import Collection
+
+    from database.client import MongoClientSingleton
+
+# The sort directions of pymongo, which is imported only when connecting.
+ASCENDING, DESCENDING = 1, -1
+
+
+def _getenv_int(key: str) -> int | None:
+    value = getenv(key)
+    return int(value) if value else None
 
 
 class Database:
     """Database template for inheritance.
 
-    NOTE: Do not forget to close the client after calling
-    the `connect_collection` method.
+    The client returned by `connect_collection` is shared by the whole
+    process and keeps its connection pool open, so there is no need to
+    close it after use.
     """
 
     collection: str
     database: str
     indices: list[tuple[str, int]]
-    client: MongoClientSingleton | None = None
+    # Non-unique indices supporting the query paths of the template.
+    secondary_indices: list[list[tuple[str, int]]] = []
+    # Names of the indices created by earlier versions, dropped on connect.
+    obsolete_indices: list[str] = []
+    client: "MongoClientSingleton | None" = None
+    # Collections whose indices were created by the current process.
+    _indexed_collections: set[tuple[str, str]] = set()
+
+    @staticmethod
+    def _pool_options() -> dict[str, int]:
+        """Connection pool options set in the environment."""
+        options = dict(
+            maxPoolSize=_getenv_int("MONGODB_MAX_POOL_SIZE"),
+            minPoolSize=_getenv_int("MONGODB_MIN_POOL_SIZE"),
+            serverSelectionTimeoutMS=_getenv_int(
+                "MONGODB_SERVER_SELECTION_TIMEOUT_MS"
+            ),
+            connectTimeoutMS=_getenv_int("MONGODB_CONNECT_TIMEOUT_MS"),
+            socketTimeoutMS=_getenv_int("MONGODB_SOCKET_TIMEOUT_MS"),
+        )
+        return {key: value for key, value in options.items() if value}
+
+    def connect_collection(self) -> "Collection":
+        from database.client import MongoClientSingleton
 
-    def connect_collection(self) -> Collection:
+        load_environment()
         self.client = MongoClientSingleton(
             is_test=True if environ["IS_TEST"].lower() == "true" else False,
             cluster_host=getenv("MONGODB_CLUSTER_HOST"),
@@ -29,14 +71,48 @@ class Database:
             port=int(getenv("MONGODB_PORT", 27017)),
             username=getenv("MONGODB_USERNAME"),
             password=getenv("MONGODB_PASSWORD"),
+            **self._pool_options(),
         )
         collection = self.client[self.database][self.collection]
-        collection.create_index(self.indices, unique=True)
+        if (self.database, self.collection) not in self._indexed_collections:
+            collection.create_index(self.indices, unique=True)
+            for index in self.secondary_indices:
+                collection.create_index(index)
+            existing = collection.index_information()
+            for name in self.obsolete_indices:
+                if name in existing:
+                    collection.drop_index(name)
+            self._indexed_collections.add((self.database, self.collection))
         return collection
 
-    def create_replacements(self, items: list[BaseModel]) -> list[ReplaceOne]:
+    @classmethod
+    def scanned_indices(cls, explanation: dict[str, Any]) -> list[str]:
+        """Return the names of the indices scanned by the winning plan of
+        an `explain()` result. It is empty for a collection scan."""
+
+        def walk(plan: Any) -> Iterator[str]:
+            if isinstance(plan, dict):
+                if plan.get("stage") == "IXSCAN":
+                    yield plan["indexName"]
+                for value in plan.values():
+                    yield from walk(value)
+            elif isinstance(plan, list):
+                for value in plan:
+                    yield from walk(value)
+
+        return list(walk(explanation["queryPlanner"]["winningPlan"]))
+
+    @classmethod
+    def index_fields(cls) -> list[str]:
+        return [index[0] for index in cls.indices]
+
+    def create_replacements(
+        self, items: list[BaseModel]
+    ) -> "list[ReplaceOne]":
         """Request replacements for `bulk_write` operation."""
-        index_fields = [index[0] for index in self.indices]
+        from pymongo import ReplaceOne
+
+        index_fields = self.index_fields()
         replacements = []
         for item in items:
             item = item.model_dump()
@@ -44,6 +120,22 @@ class Database:
             replacements.append(ReplaceOne(indices, item, upsert=True))
         return replacements
 
+    def create_upserts(self, items: list[BaseModel]) -> "list[UpdateOne]":
+        """Request upserts for `bulk_write` operation.
+
+        Unlike replacements, they keep the fields of the stored document
+        that are not part of the item (e.g. cached technologies).
+        """
+        from pymongo import UpdateOne
+
+        index_fields = self.index_fields()
+        upserts = []
+        for item in items:
+            item = item.model_dump()
+            indices = {index: item[index] for index in index_fields}
+            upserts.append(UpdateOne(indices, {"$set": item}, upsert=True))
+        return upserts
+
 
 class DatabaseVacancies(Database):
     database = "vacancy_statistics"
@@ -53,6 +145,73 @@ class DatabaseVacancies(Database):
         ("company_name", ASCENDING),
         ("years_of_experience", ASCENDING),
     ]
+    secondary_indices = [
+        # Vacancies are queried by category and publication date window.
+        [("category", ASCENDING), ("publication_date", DESCENDING)],
+    ]
+    # Fields cached by the `Wrangler` that depend on the description. The
+    # technologies extracted with each set of settings are kept apart in
+    # `extractions.<fingerprint>`, see `extraction_field`.
+    cached_fields = ("extractions",)
+    # The single cached extraction of earlier versions, removed on save.
+    obsolete_cached_fields = (
+        "description_hash",
+        "extraction_fingerprint",
+        "technologies",
+    )
+    # Number of documents per batch of a streaming cursor.
+    cursor_batch_size = 1000
+
+    def create_upserts(self, items: list[BaseModel]) -> "list[UpdateOne]":
+        """Request upserts that keep the cached technologies of a vacancy
+        unless its description has changed."""
+        from pymongo import UpdateOne
+
+        index_fields = self.index_fields()
+        upserts = []
+        for item in items:
+            item = item.model_dump()
+            indices = {index: item[index] for index in index_fields}
+            # The `$set` stage compares against the stored description.
+            unchanged = {
+                "$eq": ["$description", {"$literal": item["description"]}]
+            }
+            stage = {
+                field: {"$literal": value} for field, value in item.items()
+            }
+            stage |= {
+                field: {"$cond": [unchanged, f"${field}", "$$REMOVE"]}
+                for field in self.cached_fields
+            }
+            upserts.append(UpdateOne(indices, [{"$set": stage}], upsert=True))
+        return upserts
+
+    @staticmethod
+    def extraction_field(fingerprint: str) -> str:
+        """Field of the technologies extracted with the settings of the
+        `fingerprint` (with their description hash)."""
+        return f"extractions.{fingerprint}"
+
+    @staticmethod
+    def _match_window(
+        category: str | Iterable[str],
+        from_datetime: timedelta,
+        to_datetime: timedelta,
+        now: datetime | None = None,
+    ) -> dict[str, Any]:
+        """Match the vacancies of the `category` (or of any of several
+        categories) published within the window before `now` (by default,
+        the current time)."""
+        now = now or datetime.now(UTC)
+        if not isinstance(category, str):
+            category = {"$in": list(category)}
+        return {
+            "$and": [
+                {"category": category},
+                {"publication_date": {"$lte": now - to_datetime}},
+                {"publication_date": {"$gte": now - from_datetime}},
+            ]
+        }
 
     def fetch_vacancies(
         self,
@@ -60,28 +219,461 @@ class DatabaseVacancies(Database):
         from_datetime: timedelta,
         to_datetime: timedelta,
     ) -> list[dict[str, Any]]:
-        now = datetime.now(UTC)
         with self.client[self.database][self.collection].aggregate(
             [
                 {
-                    "$match": {
-                        "$and": [
-                            {"category": category},
-                            {"publication_date": {"$lte": now - to_datetime}},
-                            {
-                                "publication_date": {
-                                    "$gte": now - from_datetime
-                                }
-                            },
-                        ]
-                    }
+                    "$match": self._match_window(
+                        category, from_datetime, to_datetime
+                    )
                 }
             ],
         ) as vacancies:
             return [vacancy for vacancy in vacancies]
 
+    def iter_vacancies(
+        self,
+        category: str | Iterable[str],
+        from_datetime: timedelta,
+        to_datetime: timedelta,
+        fields: Iterable[str] = ("description",),
+        batch_size: int | None = None,
+        now: datetime | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Lazily yield the vacancies with only the requested `fields`.
+
+        Documents are fetched in batches while the previous ones are being
+        processed, so the memory usage is bounded by the `batch_size`.
+        """
+        with self.client[self.database][self.collection].find(
+            self._match_window(category, from_datetime, to_datetime, now),
+            {"_id": 0} | {field: 1 for field in fields},
+            batch_size=batch_size or self.cursor_batch_size,
+        ) as vacancies:
+            yield from vacancies
+
+    def newest_vacancies(
+        self, categories: Iterable[str]
+    ) -> dict[str, NewestVacancies]:
+        """The newest stored vacancies per category, read from the
+        `category` + `publication_date` index."""
+        collection = self.client[self.database][self.collection]
+        with collection.aggregate(
+            [
+                {"$match": {"category": {"$in": list(categories)}}},
+                {
+                    "$sort": {
+                        "category": ASCENDING,
+                        "publication_date": DESCENDING,
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": "$category",
+                        "newest": {"$first": "$publication_date"},
+                    }
+                },
+            ]
+        ) as dates:
+            newest = {
+                date["_id"]: NewestVacancies(publication_date=date["newest"])
+                for date in dates
+            }
+        if not newest:
+            return newest
+        with collection.find(
+            {
+                "$or": [
+                    {
+                        "category": category,
+                        "publication_date": vacancies.publication_date,
+                    }
+                    for category, vacancies in newest.items()
+                ]
+            },
+            {
+                "_id": 0,
+                "category": 1,
+                "company_name": 1,
+                "years_of_experience": 1,
+            },
+        ) as vacancies:
+            for vacancy in vacancies:
+                newest[vacancy["category"]].keys.add(
+                    (vacancy["company_name"], vacancy["years_of_experience"])
+                )
+        return newest
+
+    def explain_vacancies_query(
+        self,
+        category: str,
+        from_datetime: timedelta,
+        to_datetime: timedelta,
+    ) -> dict[str, Any]:
+        """Explain the query of `fetch_vacancies` and `iter_vacancies`.
+
+        Use `scanned_indices` on the result to check that it is served by
+        the `category` + `publication_date` index.
+        """
+        return (
+            self.client[self.database][self.collection]
+            .find(self._match_window(category, from_datetime, to_datetime))
+            .explain()
+        )
+
+    def fetch_uncached_vacancies(
+        self,
+        category: str,
+        from_datetime: timedelta,
+        to_datetime: timedelta,
+        fingerprint: str,
+    ) -> list[dict[str, Any]]:
+        """Fetch the vacancies whose technologies have not been extracted
+        yet with the settings of the `fingerprint` (or whose description
+        has changed since)."""
+        with self.client[self.database][self.collection].find(
+            self._match_window(category, from_datetime, to_datetime)
+            | {self.extraction_field(fingerprint): {"$exists": False}},
+            {field: 1 for field in [*self.index_fields(), "description"]},
+        ) as vacancies:
+            return [vacancy for vacancy in vacancies]
+
+    def aggregate_technology_frequency(
+        self,
+        category: str,
+        from_datetime: timedelta,
+        to_datetime: timedelta,
+        fingerprint: str,
+        limit: int,
+        now: datetime | None = None,
+    ) -> dict[str, int]:
+        """Sum the technologies extracted with the settings of the
+        `fingerprint` on the server and return only the `limit` most
+        common ones."""
+        extraction = self.extraction_field(fingerprint)
+        technologies = f"${extraction}.technologies"
+        with self.client[self.database][self.collection].aggregate(
+            [
+                {
+                    "$match": self._match_window(
+                        category, from_datetime, to_datetime, now
+                    )
+                    | {extraction: {"$exists": True}}
+                },
+                {"$unwind": technologies},
+                {
+                    "$group": {
+                        "_id": f"{technologies}.name",
+                        "text": {"$last": f"{technologies}.text"},
+                        "count": {"$sum": f"{technologies}.count"},
+                    }
+                },
+                {"$sort": {"count": DESCENDING, "_id": ASCENDING}},
+                {"$limit": limit},
+            ],
+        ) as frequencies:
+            return {
+                frequency["text"]: frequency["count"]
+                for frequency in frequencies
+            }
+
+    @staticmethod
+    def cached_technologies(
+        vacancy: dict[str, Any], description_hash: str
+    ) -> list[dict[str, Any]] | None:
+        """Return the technologies stored in the vacancy document if they
+        were extracted from the same description with the same settings
+        (both are part of the hash)."""
+        for extraction in vacancy.get("extractions", {}).values():
+            if extraction["description_hash"] == description_hash:
+                return extraction["technologies"]
+        return None
+
+    def save_technologies(self, entries: list[VacancyTechnologies]) -> None:
+        """Store the extracted technologies in the vacancy documents, next
+        to the ones extracted with other settings."""
+        from pymongo import UpdateOne
+
+        if not entries:
+            return
+        index_fields = self.index_fields()
+        updates = []
+        for entry in entries:
+            entry = entry.model_dump()
+            indices = {index: entry.pop(index) for index in index_fields}
+            field = self.extraction_field(entry.pop("extraction_fingerprint"))
+            updates.append(
+                UpdateOne(
+                    indices,
+                    {
+                        "$set": {field: entry},
+                        "$unset": dict.fromkeys(
+                            self.obsolete_cached_fields, ""
+                        ),
+                    },
+                )
+            )
+        self.client[self.database][self.collection].bulk_write(
+            updates, ordered=False
+        )
+
 
 class DatabaseStatistics(Database):
     database = "vacancy_statistics"
     collection = "statistics"
-    indices = [("category", ASCENDING), ("technology_frequency", ASCENDING)]
+    # Statistics are identified by their window. The unique index also
+    # serves the latest snapshot of a category: the newest `to_datetime`
+    # first and, of the windows ending then, the widest one.
+    indices = [
+        ("category", ASCENDING),
+        ("to_datetime", DESCENDING),
+        ("from_datetime", ASCENDING),
+    ]
+    # The former unique index covered the whole frequency dictionary.
+    obsolete_indices = ["category_1_technology_frequency_1"]
+    latest_sort = [("to_datetime", DESCENDING), ("from_datetime", ASCENDING)]
+
+    @staticmethod
+    def window_end(now: datetime) -> datetime:
+        """The start of the day of `now`, which the windows are relative
+        to, so the statistics of a window calculated again on the same day
+        replace the stored ones instead of adding a document per run."""
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def window_bounds(
+        cls, now: datetime, from_datetime: timedelta, to_datetime: timedelta
+    ) -> tuple[datetime, datetime]:
+        """Bounds of the window from `from_datetime` to `to_datetime`
+        before the `window_end` of `now`, stored as the key of its
+        statistics."""
+        end = cls.window_end(now)
+        return end - from_datetime, end - to_datetime
+
+    def latest_statistics(self, category: str) -> Statistics | None:
+        """Return the most recent statistics of the `category`."""
+        with self.client[self.database][self.collection].find(
+            {"category": category}, {"_id": 0}
+        ).sort(self.latest_sort).limit(1) as statistics:
+            return next(
+                (Statistics(**document) for document in statistics), None
+            )
+
+    def latest_snapshots(
+        self, categories: Iterable[str] | None = None
+    ) -> list[Statistics]:
+        """Return the most recent statistics of every category (or of the
+        `categories`), one per category."""
+        match = (
+            {}
+            if categories is None
+            else {"category": {"$in": list(categories)}}
+        )
+        with self.client[self.database][self.collection].aggregate(
+            [
+                {"$match": match},
+                {
+                    "$sort": {
+                        "category": ASCENDING,
+                        **dict(self.latest_sort),
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": "$category",
+                        "latest": {"$first": "$$ROOT"},
+                    }
+                },
+                {"$replaceRoot": {"newRoot": "$latest"}},
+                {"$project": {"_id": 0}},
+                {"$sort": {"category": ASCENDING}},
+            ]
+        ) as statistics:
+            return [Statistics(**document) for document in statistics]
+
+
+class DatabaseTechnologyRollups(Database):
+    """Daily and weekly technology counts per category and extraction
+    fingerprint.
+
+    The buckets are computed on the server from the technologies cached in
+    the vacancy documents, so the count of any range of days is a cheap sum
+    over the buckets instead of a new NLP pass. The counts of different
+    extraction settings (e.g. engines) are kept apart. Computing them
+    requires MongoDB 5.0 or newer (`$dateTrunc`).
+    """
+
+    database = "vacancy_statistics"
+    collection = "technology_rollups"
+    indices = [
+        ("category", ASCENDING),
+        ("extraction_fingerprint", ASCENDING),
+        ("granularity", ASCENDING),
+        ("bucket", DESCENDING),
+        ("name", ASCENDING),
+    ]
+    secondary_indices = [
+        # Time series of a single technology.
+        [
+            ("category", ASCENDING),
+            ("extraction_fingerprint", ASCENDING),
+            ("granularity", ASCENDING),
+            ("name", ASCENDING),
+            ("bucket", DESCENDING),
+        ],
+    ]
+    # The indices of the buckets shared by all extraction settings.
+    obsolete_indices = [
+        "category_1_granularity_1_bucket_-1_name_1",
+        "category_1_granularity_1_name_1_bucket_-1",
+    ]
+    granularities = ("day", "week")
+
+    @staticmethod
+    def bucket_start(date: datetime, granularity: str) -> datetime:
+        """Start of the bucket containing the `date`, as `$dateTrunc`
+        computes it."""
+        if date.tzinfo is not None:
+            date = date.astimezone(UTC)
+        date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        if granularity == "week":
+            date -= timedelta(days=date.weekday())
+        return date
+
+    def refresh_rollups(
+        self,
+        category: str,
+        fingerprint: str,
+        since: datetime | None = None,
+        granularities: Iterable[str] | None = None,
+    ) -> None:
+        """Recompute the buckets of the `category` and the `fingerprint`
+        from the technologies extracted with its settings, starting with
+        the bucket that contains `since` (e.g. the oldest vacancy whose
+        technologies have just been extracted), or all of them."""
+        vacancies = self.client[self.database][DatabaseVacancies.collection]
+        rollups = self.client[self.database][self.collection]
+        extraction = DatabaseVacancies.extraction_field(fingerprint)
+        technologies = f"${extraction}.technologies"
+        for granularity in granularities or self.granularities:
+            match: dict[str, Any] = {
+                "category": category,
+                extraction: {"$exists": True},
+            }
+            stale: dict[str, Any] = {
+                "category": category,
+                "extraction_fingerprint": fingerprint,
+                "granularity": granularity,
+            }
+            if since is not None:
+                start = self.bucket_start(since, granularity)
+                match["publication_date"] = {"$gte": start}
+                stale["bucket"] = {"$gte": start}
+            truncate = {"date": "$publication_date", "unit": granularity}
+            if granularity == "week":
+                truncate["startOfWeek"] = "monday"
+            # Technologies that are no longer mentioned must not survive.
+            rollups.delete_many(stale)
+            vacancies.aggregate(
+                [
+                    {"$match": match},
+                    {"$unwind": technologies},
+                    {
+                        "$group": {
+                            "_id": {
+                                "bucket": {"$dateTrunc": truncate},
+                                "name": f"{technologies}.name",
+                            },
+                            "text": {"$last": f"{technologies}.text"},
+                            "count": {"$sum": f"{technologies}.count"},
+                        }
+                    },
+                    {
+                        "$project": {
+                            "_id": 0,
+                            "category": {"$literal": category},
+                            "extraction_fingerprint": {
+                                "$literal": fingerprint
+                            },
+                            "granularity": {"$literal": granularity},
+                            "bucket": "$_id.bucket",
+                            "name": "$_id.name",
+                            "text": 1,
+                            "count": 1,
+                        }
+                    },
+                    {
+                        "$merge": {
+                            "into": self.collection,
+                            "on": self.index_fields(),
+                            "whenMatched": "replace",
+                            "whenNotMatched": "insert",
+                        }
+                    },
+                ]
+            )
+
+    def technology_frequency(
+        self,
+        category: str,
+        fingerprint: str,
+        from_datetime: datetime,
+        to_datetime: datetime,
+        granularity: str = "day",
+        limit: int = 20,
+    ) -> dict[str, int]:
+        """Sum the buckets overlapping the range and return the `limit`
+        most common technologies. The range is widened to whole buckets."""
+        with self.client[self.database][self.collection].aggregate(
+            [
+                {
+                    "$match": {
+                        "category": category,
+                        "extraction_fingerprint": fingerprint,
+                        "granularity": granularity,
+                        "bucket": {
+                            "$gte": self.bucket_start(
+                                from_datetime, granularity
+                            ),
+                            "$lte": to_datetime,
+                        },
+                    }
+                },
+                {
+                    "$group": {
+                        "_id": "$name",
+                        "text": {"$last": "$text"},
+                        "count": {"$sum": "$count"},
+                    }
+                },
+                {"$sort": {"count": DESCENDING, "_id": ASCENDING}},
+                {"$limit": limit},
+            ]
+        ) as frequencies:
+            return {
+                frequency["text"]: frequency["count"]
+                for frequency in frequencies
+            }
+
+    def time_series(
+        self,
+        category: str,
+        fingerprint: str,
+        technologies: Iterable[str],
+        granularity: str = "week",
+        from_datetime: datetime | None = None,
+    ) -> list[TechnologyRollup]:
+        """Buckets of the `technologies` in chronological order."""
+        query: dict[str, Any] = {
+            "category": category,
+            "extraction_fingerprint": fingerprint,
+            "granularity": granularity,
+            "name": {"$in": [name.lower() for name in technologies]},
+        }
+        if from_datetime is not None:
+            query["bucket"] = {
+                "$gte": self.bucket_start(from_datetime, granularity)
+            }
+        with self.client[self.database][self.collection].find(
+            query, {"_id": 0}
+        ).sort("bucket", ASCENDING) as rollups:
+            return [TechnologyRollup(**rollup) for rollup in rollups]
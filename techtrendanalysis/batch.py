@@ -0,0 +1,260 @@
+"""Calculate the statistics of many categories and windows in one pass.
+
+Usage (from the project root):
+    python -m techtrendanalysis.batch Python "C# / .NET" --windows 7 30 90
+"""
+
+import argparse
+import logging
+from collections import Counter, deque
+from datetime import UTC, datetime, timedelta
+from hashlib import sha1
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+from database import DatabaseStatistics, DatabaseVacancies, Statistics
+from techtrendanalysis.instrumentation import Instrumentation
+from techtrendanalysis.matcher import TechnologyMatcher
+from techtrendanalysis.nlp import NLPEngine
+from techtrendanalysis.normalizer import TextNormalizer
+from techtrendanalysis.stopwords import Stopwords
+from techtrendanalysis.wrangler import (
+    ENGINES,
+    count_technologies,
+    iter_proper_nouns,
+)
+
+if TYPE_CHECKING:
+    from pymongo.results import BulkWriteResult
+
+DEFAULT_WINDOWS = (7, 30, 90)  # Days.
+
+
+class BatchStatistics(DatabaseVacancies):
+    """Statistics of several categories over several windows.
+
+    The vacancies of all `categories` published within the widest window
+    are fetched with a single query and each distinct description is
+    processed by the engine once. Its technologies are then added to every
+    (category, window) bucket the vacancy belongs to. The results match the
+    ones of a `Wrangler` per category and window.
+    """
+
+    def __init__(
+        self,
+        categories: Iterable[str],
+        windows: Iterable[timedelta] = tuple(
+            timedelta(days=days) for days in DEFAULT_WINDOWS
+        ),
+        extra_filters: set[str] = set(),
+        *,
+        model: str | None = None,
+        batch_size: int = 64,
+        engine: str = "propn",
+        extra_stopwords: Iterable[str] = (),
+        exclude_stopwords: Iterable[str] = (),
+    ) -> None:
+        """Each window ends at the start of the current day (UTC), e.g.
+        `timedelta(days=7)` is the last whole week. The other arguments
+        have the same meaning as for the `Wrangler`."""
+
+        if engine not in ENGINES:
+            raise ValueError(f"`engine` must be one of {ENGINES}.")
+        self._categories = list(dict.fromkeys(categories))
+        self._windows = sorted(set(windows))
+        if not self._categories or not self._windows:
+            raise ValueError("At least one category and window are required.")
+
+        extra_stopwords = tuple(extra_stopwords)
+        exclude_stopwords = tuple(exclude_stopwords)
+        self._stopwords = {
+            category: Stopwords.get(
+                category, extra_stopwords, exclude_stopwords
+            )
+            for category in self._categories
+        }
+        self._normalizer = TextNormalizer.get(extra_filters)
+        self._model = model
+        self._batch_size = batch_size
+        self._engine = engine
+
+    def _extract(self, texts: Iterable[str]) -> Iterator[Any]:
+        """Yield what the engine extracts from each text: the counted
+        technologies of the lexicon or the spaCy technology candidates,
+        which are counted later with the stopwords of each category."""
+        instrumentation = Instrumentation.current()
+        if self._engine == "lexicon":
+            matcher = TechnologyMatcher.get()
+            for text in texts:
+                instrumentation.add("extract", documents=1)
+                yield matcher.count(text)
+            return
+        for doc in NLPEngine.get(self._model).pipe(
+            texts, batch_size=self._batch_size
+        ):
+            instrumentation.add("extract", documents=1, tokens=len(doc))
+            yield list(iter_proper_nouns(doc))
+
+    def _count(
+        self, category: str, extraction: Any
+    ) -> tuple[Counter, dict[str, str]]:
+        if self._engine == "lexicon":
+            return extraction
+        proper_nouns, lower_to_upper = Counter(), {}
+        count_technologies(
+            extraction, self._stopwords[category], proper_nouns, lower_to_upper
+        )
+        return proper_nouns, lower_to_upper
+
+    def count_vacancies(
+        self, vacancies: Iterable[dict[str, Any]], now: datetime
+    ) -> dict[tuple[str, timedelta], tuple[Counter, dict[str, str]]]:
+        """Count the technologies of the `vacancies` (with the `category`,
+        `publication_date` and `description` fields) per category and
+        window ending `now`."""
+
+        buckets = {
+            (category, window): (Counter(), {})
+            for category in self._categories
+            for window in self._windows
+        }
+        # Vacancies waiting for the extraction of their description, in
+        # order, so the buckets are merged in the same order as by the
+        # `Wrangler`.
+        pending: deque[tuple[str, datetime, str]] = deque()
+        queued: deque[str] = deque()  # Distinct descriptions being extracted.
+        extractions: dict[str, Any] = {}
+
+        def distinct_texts() -> Iterator[str]:
+            for vacancy in vacancies:
+                text = self._normalizer(vacancy["description"])
+                key = sha1(text.encode()).hexdigest()
+                pending.append(
+                    (vacancy["category"], vacancy["publication_date"], key)
+                )
+                if key not in extractions and key not in queued:
+                    queued.append(key)
+                    yield text
+
+        def fan_out() -> None:
+            while pending and pending[0][2] in extractions:
+                category, publication_date, key = pending.popleft()
+                if publication_date.tzinfo is None:
+                    publication_date = publication_date.replace(tzinfo=UTC)
+                windows = [
+                    window
+                    for window in self._windows
+                    if publication_date >= now - window
+                ]
+                if not windows or publication_date > now:
+                    continue
+                proper_nouns, lower_to_upper = self._count(
+                    category, extractions[key]
+                )
+                for window in windows:
+                    bucket_nouns, bucket_lower_to_upper = buckets[
+                        (category, window)
+                    ]
+                    bucket_nouns.update(proper_nouns)
+                    bucket_lower_to_upper.update(lower_to_upper)
+
+        for extraction in self._extract(distinct_texts()):
+            extractions[queued.popleft()] = extraction
+            fan_out()
+        fan_out()
+        return buckets
+
+    def calculate_frequency_distributions(
+        self, limit_results: int = 20
+    ) -> list[Statistics]:
+        """Fetch the vacancies and calculate the statistics of every
+        category and window."""
+        instrumentation = Instrumentation.current()
+        now = DatabaseStatistics.window_end(datetime.now(UTC))
+        self.connect_collection()
+        vacancies = instrumentation.timed(
+            "fetch_vacancies",
+            self.iter_vacancies(
+                self._categories,
+                self._windows[-1],
+                timedelta(days=0),
+                fields=("category", "publication_date", "description"),
+                now=now,
+            ),
+        )
+        with instrumentation.stage("extract"):
+            buckets = self.count_vacancies(vacancies, now)
+        statistics = []
+        for (category, window), (
+            proper_nouns,
+            lower_to_upper,
+        ) in buckets.items():
+            from_datetime, to_datetime = DatabaseStatistics.window_bounds(
+                now, window, timedelta(days=0)
+            )
+            statistics.append(
+                Statistics(
+                    category=category,
+                    from_datetime=from_datetime,
+                    to_datetime=to_datetime,
+                    technology_frequency={
+                        lower_to_upper[name]: count
+                        for name, count in proper_nouns.most_common(
+                            limit_results
+                        )
+                    },
+                )
+            )
+        return statistics
+
+    @staticmethod
+    def save_statistics(statistics: list[Statistics]) -> "BulkWriteResult":
+        """Save all the statistics with a single `bulk_write`."""
+        db = DatabaseStatistics()
+        collection = db.connect_collection()
+        with Instrumentation.current().stage(
+            "save_statistics", items=len(statistics)
+        ):
+            return collection.bulk_write(
+                db.create_replacements(statistics), ordered=False
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("categories", nargs="+")
+    parser.add_argument(
+        "--windows",
+        nargs="+",
+        type=int,
+        default=DEFAULT_WINDOWS,
+        help="window lengths in days",
+    )
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--engine", choices=ENGINES, default="propn")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the statistics instead of saving them",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    with Instrumentation.run("batch_statistics"):
+        batch = BatchStatistics(
+            args.categories,
+            [timedelta(days=days) for days in args.windows],
+            batch_size=args.batch_size,
+            engine=args.engine,
+        )
+        statistics = batch.calculate_frequency_distributions(args.limit)
+        if args.dry_run:
+            for item in statistics:
+                print(item.model_dump_json())
+        else:
+            batch.save_statistics(statistics)
+            print(f"Saved {len(statistics)} statistics.")
+
+
+if __name__ == "__main__":
+    main()
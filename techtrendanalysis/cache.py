@@ -0,0 +1,68 @@
+import sqlite3
+from json import dumps, loads
+from pathlib import Path
+from typing import Any
+
+from database import DatabaseVacancies, VacancyTechnologies
+
+
+class TechnologyCache:
+    """Per-vacancy technologies stored in a local SQLite file.
+
+    It is the counterpart of the technologies cached in the MongoDB vacancy
+    documents for the CSV path, see `CrawlToCSV`.
+    """
+
+    file = Path("vacancy_technologies.sqlite")
+
+    def __init__(self, file: str | Path | None = None) -> None:
+        self._connection = sqlite3.connect(file or self.file)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS technologies ("
+            "vacancy TEXT PRIMARY KEY, "
+            "description_hash TEXT NOT NULL, "
+            "technologies TEXT NOT NULL)"
+        )
+
+    @staticmethod
+    def _key(vacancy: dict[str, Any]) -> str:
+        """Serialize the unique index of the vacancy.
+
+        Values are stringified, so the vacancies read from a CSV file match
+        the ones validated by `VacancyTechnologies`.
+        """
+        return dumps(
+            [str(vacancy[field]) for field in DatabaseVacancies.index_fields()]
+        )
+
+    def cached_technologies(
+        self, vacancy: dict[str, Any], description_hash: str
+    ) -> list[dict[str, Any]] | None:
+        row = self._connection.execute(
+            "SELECT technologies FROM technologies "
+            "WHERE vacancy = ? AND description_hash = ?",
+            (self._key(vacancy), description_hash),
+        ).fetchone()
+        return loads(row[0]) if row else None
+
+    def save_technologies(self, entries: list[VacancyTechnologies]) -> None:
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO technologies VALUES (?, ?, ?)",
+                [
+                    (
+                        self._key(dict(entry)),
+                        entry.description_hash,
+                        dumps(
+                            [
+                                technology.model_dump()
+                                for technology in entry.technologies
+                            ]
+                        ),
+                    )
+                    for entry in entries
+                ],
+            )
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,338 @@
+import json
+import logging
+import os
+import re
+import resource
+import threading
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from os import getenv
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Iterable, Iterator, TypeVar
+
+from database import load_environment
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+EXPORT_FORMATS = ("log", "json", "prometheus")
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process so far (KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+_statm: int | None = None
+
+
+def rss_mb() -> float:
+    """Current resident set size of the process, read from procfs (the
+    peak one where it is not available)."""
+    global _statm
+    try:
+        if _statm is None:
+            _statm = os.open("/proc/self/statm", os.O_RDONLY)
+        pages = int(os.pread(_statm, 64, 0).split()[1])
+    except OSError:
+        return peak_rss_mb()
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+class _Frame:
+    """A stage being recorded by a thread."""
+
+    __slots__ = (
+        "nested_seconds",
+        "nested_growth",
+        "rss",
+        "traced",
+        "traced_peak",
+    )
+
+    def __init__(self) -> None:
+        self.nested_seconds = 0.0
+        self.nested_growth = 0.0
+        self.rss = rss_mb()
+        # Traced memory when the stage started and its peak so far.
+        self.traced = self.traced_peak = (
+            tracemalloc.get_traced_memory()[0]
+            if tracemalloc.is_tracing()
+            else 0
+        )
+
+
+class Instrumentation:
+    """Wall time, counts and memory of the stages of a run.
+
+    A run (e.g. a `CrawlToCSV` run or a crawl) is started with `run` or
+    `start`, the crawl, the pipelines and the `Wrangler` then record their
+    stages in `Instrumentation.current()`. The time of a stage excludes the
+    nested ones (e.g. "clean" excludes "fetch_vacancies" it pulls from).
+    Stages of worker processes are not recorded.
+
+    The memory of a stage is the growth of the RSS while it runs, without
+    the nested stages (`rss_growth_mb`, negative if it freed memory). With
+    `INSTRUMENTATION_TRACEMALLOC=true`, the peak of the memory allocated by
+    Python during the stage (over the memory allocated when it started) is
+    recorded as well (`traced_peak_mb`), at the cost of a slower run.
+
+    When the run finishes, it is exported in the `INSTRUMENTATION_EXPORT`
+    formats ("log", "json", "prometheus", comma-separated) to the
+    `INSTRUMENTATION_DIR`, and set `INSTRUMENTATION_PROFILER` ("cprofile"
+    or "pyinstrument") to profile it.
+    """
+
+    _current: "Instrumentation | None" = None
+    _default: "Instrumentation | None" = None
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started_at = datetime.now(UTC)
+        self.stages: defaultdict[str, dict[str, float]] = defaultdict(
+            lambda: {"seconds": 0.0}
+        )
+        self._started = perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Stack of the nested stages.
+        self._previous: Instrumentation | None = None
+        self._profiler: Any = None
+        self._tracing = False
+
+    @classmethod
+    def current(cls) -> "Instrumentation":
+        """The instrumentation of the current run (or a default one, which
+        is never exported)."""
+        if cls._current is not None:
+            return cls._current
+        if cls._default is None:
+            cls._default = cls("default")
+        return cls._default
+
+    @classmethod
+    def active(cls) -> bool:
+        return cls._current is not None
+
+    @classmethod
+    def start(cls, name: str) -> "Instrumentation":
+        instrumentation = cls(name)
+        instrumentation._previous = cls._current
+        cls._current = instrumentation
+        instrumentation._start_tracing()
+        instrumentation._start_profiler()
+        return instrumentation
+
+    def finish(self) -> None:
+        self._stop_profiler()
+        if self._tracing:
+            tracemalloc.stop()
+        type(self)._current = self._previous
+        self.report()
+
+    @classmethod
+    @contextmanager
+    def run(cls, name: str) -> Iterator["Instrumentation"]:
+        instrumentation = cls.start(name)
+        try:
+            yield instrumentation
+        finally:
+            instrumentation.finish()
+
+    def _stack(self) -> list[_Frame]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _enter(self) -> float:
+        stack = self._stack()
+        if tracemalloc.is_tracing():
+            # The peak of the enclosing stage so far, before it is reset.
+            if stack:
+                stack[-1].traced_peak = max(
+                    stack[-1].traced_peak, tracemalloc.get_traced_memory()[1]
+                )
+            tracemalloc.reset_peak()
+        stack.append(_Frame())
+        return perf_counter()
+
+    def _exit(self, name: str, started: float, **counts: float) -> None:
+        elapsed = perf_counter() - started
+        stack = self._stack()
+        frame = stack.pop()
+        growth = rss_mb() - frame.rss
+        if stack:
+            stack[-1].nested_seconds += elapsed
+            stack[-1].nested_growth += growth
+        self.add(
+            name,
+            elapsed - frame.nested_seconds,
+            rss_growth_mb=growth - frame.nested_growth,
+            **counts,
+        )
+        if tracemalloc.is_tracing():
+            peak = max(frame.traced_peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].traced_peak = max(stack[-1].traced_peak, peak)
+            with self._lock:
+                stage = self.stages[name]
+                stage["traced_peak_mb"] = max(
+                    stage.get("traced_peak_mb", 0.0),
+                    (peak - frame.traced) / 2**20,
+                )
+
+    def add(self, name: str, seconds: float = 0.0, **counts: float) -> None:
+        """Add the time and `counts` (e.g. `items=1`) to the stage."""
+        with self._lock:
+            stage = self.stages[name]
+            stage["seconds"] += seconds
+            for key, count in counts.items():
+                stage[key] = stage.get(key, 0) + count
+
+    @contextmanager
+    def stage(self, name: str, **counts: float) -> Iterator[None]:
+        started = self._enter()
+        try:
+            yield
+        finally:
+            self._exit(name, started, calls=1, **counts)
+
+    def timed(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Yield the items of the `iterable`, recording the time spent on
+        producing them (e.g. by a lazy cursor) and their number."""
+        iterator = iter(iterable)
+        while True:
+            started, items = self._enter(), 0
+            try:
+                item = next(iterator)
+                items = 1
+            except StopIteration:
+                return
+            finally:
+                # Pop the frame even if the iterable fails.
+                self._exit(name, started, items=items)
+            yield item
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self.stages.items()}
+        return {
+            "run": self.name,
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": perf_counter() - self._started,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": stages,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format, one gauge per measurement."""
+        run = self.to_dict()
+        lines = [
+            "# TYPE techtrend_run_wall_seconds gauge",
+            f'techtrend_run_wall_seconds{{run="{self.name}"}} '
+            f"{run['wall_seconds']}",
+        ]
+        metrics = sorted(
+            {key for stage in run["stages"].values() for key in stage}
+        )
+        for metric in metrics:
+            lines.append(f"# TYPE techtrend_stage_{metric} gauge")
+            for name, stage in run["stages"].items():
+                if metric in stage:
+                    lines.append(
+                        f'techtrend_stage_{metric}{{run="{self.name}",'
+                        f'stage="{name}"}} {stage[metric]}'
+                    )
+        return "\n".join(lines) + "\n"
+
+    def to_log_line(self) -> str:
+        run = self.to_dict()
+        stages = [
+            f"{name} "
+            + " ".join(
+                (
+                    f"{key}={value:.3f}"
+                    if isinstance(value, float)
+                    else f"{key}={value}"
+                )
+                for key, value in stage.items()
+            )
+            for name, stage in run["stages"].items()
+        ]
+        return " | ".join(
+            [
+                f"run={self.name} wall_seconds={run['wall_seconds']:.3f} "
+                f"peak_rss_mb={run['peak_rss_mb']:.1f}",
+                *stages,
+            ]
+        )
+
+    def _file(self, suffix: str) -> Path:
+        directory = Path(getenv("INSTRUMENTATION_DIR") or "instrumentation")
+        directory.mkdir(parents=True, exist_ok=True)
+        name = re.sub(r"[^\w.-]+", "-", self.name)  # E.g. "C# / .NET".
+        return directory / f"{name}-{self.started_at:%Y%m%dT%H%M%S}{suffix}"
+
+    def report(self) -> None:
+        """Export the run in the `INSTRUMENTATION_EXPORT` formats."""
+        load_environment()
+        formats = getenv("INSTRUMENTATION_EXPORT") or "log"
+        for format_ in filter(None, map(str.strip, formats.split(","))):
+            if format_ == "log":
+                logger.info(self.to_log_line())
+            elif format_ == "json":
+                self._file(".json").write_text(self.to_json() + "\n")
+            elif format_ == "prometheus":
+                self._file(".prom").write_text(self.to_prometheus())
+            else:
+                raise ValueError(
+                    f"Instrumentation export must be one of {EXPORT_FORMATS}."
+                )
+
+    def _start_tracing(self) -> None:
+        load_environment()
+        tracing = getenv("INSTRUMENTATION_TRACEMALLOC") or "false"
+        if tracing.lower() == "true" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def _start_profiler(self) -> None:
+        load_environment()
+        profiler = getenv("INSTRUMENTATION_PROFILER")
+        if not profiler:
+            return
+        if profiler == "cprofile":
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif profiler == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("pyinstrument is not installed, not profiling")
+                return
+            self._profiler = Profiler()
+            self._profiler.start()
+        else:
+            raise ValueError(f"Profiler must be one of {PROFILERS}.")
+
+    def _stop_profiler(self) -> None:
+        if self._profiler is None:
+            return
+        if hasattr(self._profiler, "output_html"):  # pyinstrument
+            self._profiler.stop()
+            file = self._file(".html")
+            file.write_text(self._profiler.output_html())
+        else:
+            self._profiler.disable()
+            file = self._file(".prof")
+            self._profiler.dump_stats(file)
+        logger.info("Profile of the %s run saved to %s", self.name, file)
+        self._profiler = None
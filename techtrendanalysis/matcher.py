@@ -0,0 +1,93 @@
+import re
+from collections import Counter
+from hashlib import sha1
+from json import loads
+from pathlib import Path
+
+LEXICON_FILE = Path(__file__).parent / "lexicon" / "technologies.json"
+
+# A term must not be glued to other word characters, e.g. "Go" in "Google"
+# or "C" in "C++". A trailing dot (end of a sentence) is allowed.
+TERM_START, TERM_END = r"(?<![\w+#.])", r"(?![\w+#]|\.\w)"
+
+
+class TechnologyMatcher:
+    """Count technologies from a curated lexicon in a single regex pass.
+
+    Every technology of the lexicon has a canonical name and, optionally,
+    aliases (e.g. "Postgres" for "PostgreSQL") which are counted under the
+    canonical name. Terms are matched case-insensitively unless the entry
+    is `case_sensitive` (e.g. "Go" or "Swift", which are common words).
+    """
+
+    _matchers: dict[Path, "TechnologyMatcher"] = {}
+    # Changed with the matching rules, so that cached counts are redone.
+    version = 2
+
+    def __init__(self, lexicon: list[dict]) -> None:
+        # Term (key) -> canonical name, insensitive terms are casefolded.
+        self._sensitive: dict[str, str] = {}
+        self._insensitive: dict[str, str] = {}
+        terms = []  # (term, pattern, canonical name)
+        # Patterns of the insensitive terms, to resolve rare case matches.
+        self._insensitive_patterns: list[tuple[re.Pattern, str]] = []
+        for entry in lexicon:
+            case_sensitive = entry.get("case_sensitive", False)
+            for term in [entry["name"], *entry.get("aliases", [])]:
+                pattern = re.escape(term).replace(r"\ ", r"\s+")
+                if case_sensitive:
+                    self._sensitive[term] = entry["name"]
+                else:
+                    self._insensitive[term.casefold()] = entry["name"]
+                    pattern = f"(?i:{pattern})"
+                    self._insensitive_patterns.append(
+                        (re.compile(pattern), entry["name"])
+                    )
+                terms.append((term, pattern, entry["name"]))
+
+        # One alternation with the longest terms first, so "Node.js" wins
+        # over "Node" and "Ruby on Rails" over "Ruby", whatever their case
+        # sensitivity.
+        terms.sort(key=lambda term: len(term[0]), reverse=True)
+        self._pattern = re.compile(
+            rf"{TERM_START}(?:{'|'.join(pattern for _, pattern, _ in terms)})"
+            rf"{TERM_END}"
+        )
+        self.fingerprint = sha1(
+            repr((self.version, lexicon)).encode()
+        ).hexdigest()
+
+    @classmethod
+    def get(cls, file: Path | None = None) -> "TechnologyMatcher":
+        """Return the matcher of the lexicon `file`, compiling it once per
+        process."""
+        file = file or LEXICON_FILE
+        if file not in cls._matchers:
+            cls._matchers[file] = cls(loads(file.read_text()))
+        return cls._matchers[file]
+
+    def count(self, text: str) -> tuple[Counter, dict[str, str]]:
+        """Count the technologies mentioned in the `text`.
+
+        The result has the same shape as the proper noun counts: lowercased
+        canonical names and their spelling.
+        """
+        technologies, lower_to_upper = Counter(), {}
+        for match in self._pattern.finditer(text):
+            name = self._canonical_name(re.sub(r"\s+", " ", match[0]))
+            technologies[name.lower()] += 1
+            lower_to_upper[name.lower()] = name
+        return technologies, lower_to_upper
+
+    def _canonical_name(self, term: str) -> str:
+        """The canonical name of a matched term."""
+        if (name := self._sensitive.get(term)) is not None:
+            return name
+        if (name := self._insensitive.get(term.casefold())) is not None:
+            return name
+        # A case match `casefold` disagrees with, e.g. the dotless "ı".
+        return next(
+            name
+            for pattern, name in self._insensitive_patterns
+            if pattern.fullmatch(term)
+        )
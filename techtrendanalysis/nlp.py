@@ -0,0 +1,55 @@
+from os import getenv
+from typing import TYPE_CHECKING
+
+from database import load_environment
+
+if TYPE_CHECKING:
+    from spacy.language import Language
+
+
+class NLPEngine:
+    """Process-wide registry of loaded spaCy pipelines.
+
+    Loading a model takes seconds and hundreds of MB, so every pipeline is
+    loaded lazily on first use and then shared by all `Wrangler` instances
+    (and all categories) of the current process.
+    """
+
+    # Only the tagger is needed to detect proper nouns, everything
+    # else just slows the pipeline down.
+    disabled_components = ("parser", "ner", "lemmatizer")
+    _pipelines: dict[tuple[str, tuple[str, ...]], "Language"] = {}
+
+    @staticmethod
+    def default_model() -> str:
+        load_environment()
+        return getenv("SPACY_MODEL", "en_core_web_sm")
+
+    @classmethod
+    def get(
+        cls,
+        model: str | None = None,
+        disable: tuple[str, ...] | None = None,
+    ) -> "Language":
+        """Return the pipeline for the `model`, loading it (and spaCy) if
+        necessary."""
+        model = model or cls.default_model()
+        disable = cls.disabled_components if disable is None else disable
+        key = (model, tuple(sorted(disable)))
+        if key not in cls._pipelines:
+            import spacy
+
+            cls._pipelines[key] = spacy.load(model, disable=list(disable))
+        return cls._pipelines[key]
+
+    @classmethod
+    def warm_up(cls, model: str | None = None) -> "Language":
+        """Load the pipeline eagerly, e.g. at the startup of a long run."""
+        nlp = cls.get(model)
+        nlp("Warm up")  # The first call initializes lazy model internals.
+        return nlp
+
+    @classmethod
+    def clear(cls) -> None:
+        """Release all loaded pipelines."""
+        cls._pipelines.clear()
@@ -0,0 +1,42 @@
+import re
+from html import unescape
+from typing import Iterable, Iterator
+
+
+class TextNormalizer:
+    """Clean up vacancy descriptions in a single regex pass.
+
+    Filters (literal strings, matched case-insensitively) and HTML tags are
+    replaced with a space by one precompiled pattern, which is shared by
+    all normalizers with the same filters (see `get`). HTML entities are
+    decoded afterwards, only in the texts that contain any.
+    """
+
+    default_filters = frozenset({"<br>", "<b>", "</b>", "• ", "- "})
+    _normalizers: dict[frozenset[str], "TextNormalizer"] = {}
+
+    def __init__(self, filters: frozenset[str]) -> None:
+        # The longest filters go first, so they win over their prefixes.
+        terms = sorted(filters, key=len, reverse=True)
+        self._pattern = re.compile(
+            rf"{'|'.join(map(re.escape, terms))}|</?[a-z][^>]*>",
+            flags=re.IGNORECASE,
+        )
+
+    @classmethod
+    def get(cls, extra_filters: Iterable[str] = ()) -> "TextNormalizer":
+        """Return the shared normalizer of the default and extra filters."""
+        filters = cls.default_filters | frozenset(extra_filters)
+        if filters not in cls._normalizers:
+            cls._normalizers[filters] = cls(filters)
+        return cls._normalizers[filters]
+
+    def __call__(self, text: str) -> str:
+        # A string replacement is several times faster than a callback.
+        text = self._pattern.sub(" ", text)
+        return unescape(text) if "&" in text else text
+
+    def stream(self, texts: Iterable[str]) -> Iterator[str]:
+        """Lazily normalize the `texts` one by one."""
+        for text in texts:
+            yield self(text)
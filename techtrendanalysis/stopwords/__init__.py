@@ -0,0 +1,65 @@
+import re
+from hashlib import sha1
+from json import loads
+from os import getenv
+from pathlib import Path
+from typing import Iterable
+
+from database import load_environment
+
+STOPWORDS_DIR = Path(__file__).parent
+COMMON_FILES = ("ukrainian-stopwords.json", "common-words.json")
+
+
+class Stopwords:
+    """Process-wide registry of stopword sets.
+
+    A set consists of the common stopwords, the stopwords of the category
+    (`categories/<category>.json`, if present), the user file set in the
+    `STOPWORDS_FILE` environment variable and the `extra` words, without
+    the words of the `STOPWORDS_EXCLUDE_FILE` and the `exclude` words.
+    Each combination is read once and shared as a `frozenset`.
+    """
+
+    _sets: dict[tuple, frozenset[str]] = {}
+
+    @staticmethod
+    def category_file(category: str) -> Path:
+        slug = re.sub(r"[^\w+#.]+", "-", category).strip("-").lower()
+        return STOPWORDS_DIR / "categories" / f"{slug}.json"
+
+    @classmethod
+    def get(
+        cls,
+        category: str | None = None,
+        extra: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+    ) -> frozenset[str]:
+        files = [STOPWORDS_DIR / file for file in COMMON_FILES]
+        if category is not None:
+            files.append(cls.category_file(category))
+        load_environment()
+        if user_file := getenv("STOPWORDS_FILE"):
+            files.append(Path(user_file))
+        files = tuple(file for file in files if file.exists())
+        exclude_files = ()
+        if exclude_file := getenv("STOPWORDS_EXCLUDE_FILE"):
+            exclude_files = tuple(
+                file for file in [Path(exclude_file)] if file.exists()
+            )
+        key = (files, exclude_files, frozenset(extra), frozenset(exclude))
+        if key not in cls._sets:
+            words = cls._read(files) | key[2]
+            cls._sets[key] = frozenset(
+                words - cls._read(exclude_files) - key[3]
+            )
+        return cls._sets[key]
+
+    @staticmethod
+    def _read(files: Iterable[Path]) -> set[str]:
+        return {word for file in files for word in loads(file.read_text())}
+
+    @staticmethod
+    def fingerprint(stopwords: frozenset[str]) -> str:
+        """Stable (unlike `hash`) fingerprint of a stopword set."""
+        return sha1("\n".join(sorted(stopwords)).encode()).hexdigest()
@@ -1,18 +1,155 @@
 import csv
-import re
-from collections import Counter
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import UTC, datetime, timedelta
-from json import loads
-from os.path import join as join_path
+from hashlib import sha1
+from itertools import islice
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
 
-import spacy
-from pymongo.results import BulkWriteResult
+from database import (
+    DatabaseStatistics,
+    DatabaseTechnologyRollups,
+    DatabaseVacancies,
+    ParquetStatistics,
+    Statistics,
+    TechnologyCount,
+    VacancyTechnologies,
+)
+from techtrendanalysis.cache import TechnologyCache
+from techtrendanalysis.instrumentation import Instrumentation
+from techtrendanalysis.matcher import TechnologyMatcher
+from techtrendanalysis.nlp import NLPEngine
+from techtrendanalysis.normalizer import TextNormalizer
+from techtrendanalysis.stopwords import Stopwords
 
-from database import DatabaseStatistics, DatabaseVacancies, Statistics
+if TYPE_CHECKING:
+    from pymongo.results import BulkWriteResult
+    from spacy.tokens import Doc
 
-STOPWORDS_DIR = join_path("techtrendanalysis", "stopwords")
+# Unicode ranges for English letters.
+ENG_UPPERCASE, ENG_LOWERCASE = range(65, 90), range(97, 122)
+# Number of `nlp.pipe` batches sent to a worker process at once.
+SHARD_BATCHES = 8
+# Technology extraction engines: spaCy proper nouns or a curated lexicon.
+ENGINES = ("propn", "lexicon")
+# Formats of the files the statistics are saved to without MongoDB.
+FILE_FORMATS = ("csv", "parquet")
+
+
+def iter_proper_nouns(doc: "Doc") -> Iterator[str]:
+    """Yield the proper nouns of the `doc` that start with an English
+    letter, the technology candidates."""
+    for token in doc:
+        if token.pos_ == "PROPN" and (  # IT techs are mostly proper nouns.
+            ord((token_text := token.text)[0]) in ENG_UPPERCASE
+            or ord(token_text[0]) in ENG_LOWERCASE
+        ):
+            yield token_text
+
+
+def count_technologies(
+    texts: Iterable[str],
+    stopwords: frozenset[str],
+    proper_nouns: Counter,
+    lower_to_upper: dict[str, str],
+) -> None:
+    """Add the candidate `texts` that are not stopwords to the
+    `proper_nouns` counter and remember their original spelling in
+    `lower_to_upper`."""
+    for text in texts:
+        if text not in stopwords:
+            proper_nouns[text.lower()] += 1
+            lower_to_upper[text.lower()] = text
+
+
+def count_proper_nouns(
+    doc: "Doc",
+    stopwords: frozenset[str],
+    proper_nouns: Counter,
+    lower_to_upper: dict[str, str],
+) -> None:
+    """Add the technologies mentioned in the `doc` to the `proper_nouns`
+    counter and remember their original spelling in `lower_to_upper`."""
+    count_technologies(
+        iter_proper_nouns(doc), stopwords, proper_nouns, lower_to_upper
+    )
+
+
+def iter_document_counts(
+    texts: Iterable[str],
+    stopwords: frozenset[str],
+    model: str | None,
+    batch_size: int,
+    engine: str = "propn",
+) -> Iterator[tuple[Counter, dict[str, str]]]:
+    """Yield the technologies of each text counted by the `engine`."""
+    instrumentation = Instrumentation.current()
+    if engine == "lexicon":
+        matcher = TechnologyMatcher.get()
+        for text in texts:
+            instrumentation.add("extract", documents=1)
+            yield matcher.count(text)
+        return
+    for doc in NLPEngine.get(model).pipe(texts, batch_size=batch_size):
+        instrumentation.add("extract", documents=1, tokens=len(doc))
+        proper_nouns, lower_to_upper = Counter(), {}
+        count_proper_nouns(doc, stopwords, proper_nouns, lower_to_upper)
+        yield proper_nouns, lower_to_upper
+
+
+def count_shard(
+    texts: Iterable[str],
+    stopwords: frozenset[str],
+    model: str | None,
+    batch_size: int,
+    engine: str = "propn",
+) -> tuple[Counter, dict[str, str]]:
+    """Count the technologies of a shard of descriptions.
+
+    When it runs in a worker process, the spaCy model is loaded once per
+    worker and only the (small) counts are sent back.
+    """
+    proper_nouns, lower_to_upper = Counter(), {}
+    for doc_proper_nouns, doc_lower_to_upper in iter_document_counts(
+        texts, stopwords, model, batch_size, engine
+    ):
+        proper_nouns.update(doc_proper_nouns)
+        lower_to_upper.update(doc_lower_to_upper)
+    return proper_nouns, lower_to_upper
+
+
+def count_documents(
+    texts: list[str],
+    stopwords: frozenset[str],
+    model: str | None,
+    batch_size: int,
+    engine: str = "propn",
+) -> list[tuple[Counter, dict[str, str]]]:
+    """Count the technologies of each description of a shard separately."""
+    return list(
+        iter_document_counts(texts, stopwords, model, batch_size, engine)
+    )
+
+
+def description_hash(description: str, *settings: str) -> str:
+    """Fingerprint the description together with the extraction settings,
+    so that changing either of them invalidates the cached technologies."""
+    return sha1("\0".join([*settings, description]).encode()).hexdigest()
+
+
+def settings_fingerprint(*settings: str) -> str:
+    """Fingerprint the extraction settings alone, stored next to the
+    cached technologies of a vacancy."""
+    return sha1("\0".join(settings).encode()).hexdigest()
+
+
+def split_into_shards(
+    texts: Iterable[str], shard_size: int
+) -> Iterator[list[str]]:
+    texts = iter(texts)
+    while shard := list(islice(texts, shard_size)):
+        yield shard
 
 
 class Wrangler(DatabaseVacancies):
@@ -20,115 +157,415 @@ class Wrangler(DatabaseVacancies):
 
     def __init__(
         self,
-        text: str | None,
+        text: str | Iterable[str] | None,
         category: str,
         extra_filters: set[str] = set(),
+        *,
+        model: str | None = None,
+        stream: bool = False,
+        batch_size: int = 64,
+        n_process: int = 1,
+        incremental: bool = False,
+        vacancies: Iterable[dict[str, Any]] | None = None,
+        cache: TechnologyCache | None = None,
+        engine: str = "propn",
+        extra_stopwords: Iterable[str] = (),
+        exclude_stopwords: Iterable[str] = (),
     ) -> None:
         """If the `text` is not passed, it will be retrieved from the
-        vacancies in MongoDB."""
+        vacancies in MongoDB. The spaCy `model` is shared between all
+        instances, see `NLPEngine`.
+
+        Pass an iterable of descriptions instead of a single `text` (or set
+        `stream` when fetching from MongoDB) to process the descriptions one
+        by one with `nlp.pipe` in batches of `batch_size`. Memory usage then
+        does not depend on the number of vacancies.
+
+        With `n_process` greater than one, the descriptions are streamed
+        and sharded across a pool of worker processes. The result is
+        identical to the one of a single process.
 
-        self._text = text
+        In the `incremental` mode, technologies are extracted per vacancy
+        and cached, so only new or changed descriptions are processed by
+        spaCy. They are cached in the MongoDB vacancy documents, unless
+        `vacancies` (e.g. rows of a CSV file) are passed along with a local
+        `cache`.
+
+        The `engine` selects how technologies are extracted: "propn" counts
+        the proper nouns tagged by spaCy, "lexicon" counts the technologies
+        of a curated lexicon (see `TechnologyMatcher`), which is much faster
+        and ignores company names, cities, etc.
+
+        Stopwords are shared between instances, see `Stopwords`. The
+        `extra_stopwords` are added to them and the `exclude_stopwords`
+        (e.g. a technology listed as a common word) are removed."""
+
+        if engine not in ENGINES:
+            raise ValueError(f"`engine` must be one of {ENGINES}.")
+
+        if text is None or isinstance(text, str):
+            self._text, self._texts = text, None
+        else:
+            self._text, self._texts = None, text
         self._category = category
         self._extra_filters = extra_filters
+        self._normalizer = TextNormalizer.get(extra_filters)
+        self._model = model
+        self._stream = stream or n_process > 1
+        self._batch_size = batch_size
+        self._n_process = n_process
+        self._incremental = incremental or vacancies is not None
+        self._vacancies = vacancies
+        self._cache = cache
+        self._engine = engine
         self._from_datetime: timedelta = timedelta(days=0)
         self._to_datetime: timedelta = timedelta(days=0)
+        # The end the window of the fetched vacancies is relative to.
+        self._window_end: datetime | None = None
+        self._stopwords = Stopwords.get(
+            category, extra_stopwords, exclude_stopwords
+        )
 
-        with open(
-            join_path(STOPWORDS_DIR, "ukrainian-stopwords.json")
-        ) as ukr_stopwords, open(
-            join_path(STOPWORDS_DIR, "common-words.json")
-        ) as common_words:
-            self._stopwords = set(
-                loads(ukr_stopwords.read()) + loads(common_words.read())
-            )
+    def _clean_text(self, text: str) -> str:
+        return self._normalizer(text)
+
+    def _map_shards(
+        self, function: Callable[..., Any], texts: Iterable[str]
+    ) -> Iterator[Any]:
+        """Apply the `function` to shards of the `texts` in worker processes
+        and yield the results in the order of the shards."""
+
+        with ProcessPoolExecutor(self._n_process) as executor:
+            # Keep a bounded number of shards in flight to cap memory usage.
+            pending: deque[Future] = deque()
+            for shard in split_into_shards(
+                texts, self._batch_size * SHARD_BATCHES
+            ):
+                pending.append(
+                    executor.submit(
+                        function,
+                        shard,
+                        self._stopwords,
+                        self._model,
+                        self._batch_size,
+                        self._engine,
+                    )
+                )
+                if len(pending) > 2 * self._n_process:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
 
-    def _clean_text(self) -> str:
-        to_filter = {"<br>", "<b>", "</b>", "• ", "- "}.union(
-            self._extra_filters
+    def _count_in_parallel(
+        self, texts: Iterable[str]
+    ) -> tuple[Counter, dict[str, str]]:
+        """Merge the counts of the shards in their order, so that the
+        counter order and the spelling of the technologies match the
+        single-process run."""
+
+        proper_nouns, lower_to_upper = Counter(), {}
+        for shard_proper_nouns, shard_lower_to_upper in self._map_shards(
+            count_shard, texts
+        ):
+            proper_nouns.update(shard_proper_nouns)
+            lower_to_upper.update(shard_lower_to_upper)
+        return proper_nouns, lower_to_upper
+
+    def _count_documents(
+        self, texts: Iterable[str]
+    ) -> Iterator[tuple[Counter, dict[str, str]]]:
+        """Yield the counts of each text separately."""
+        if self._n_process > 1:
+            for shard_counts in self._map_shards(count_documents, texts):
+                yield from shard_counts
+            return
+        yield from iter_document_counts(
+            texts, self._stopwords, self._model, self._batch_size, self._engine
+        )
+
+    def _extraction_settings(self) -> list[str]:
+        """Settings that affect the technologies extracted from a text."""
+        if self._engine == "lexicon":
+            settings = [self._engine, TechnologyMatcher.get().fingerprint]
+        else:
+            settings = [
+                self._engine,
+                self._model or NLPEngine.default_model(),
+                Stopwords.fingerprint(self._stopwords),
+            ]
+        return settings + sorted(self._extra_filters)
+
+    def extraction_fingerprint(self) -> str:
+        """Fingerprint of the settings the technologies are extracted
+        with, see `DatabaseTechnologyRollups.refresh_rollups`."""
+        return settings_fingerprint(*self._extraction_settings())
+
+    def _count_incrementally(self) -> tuple[Counter, dict[str, str]]:
+        """Aggregate the cached technologies of the vacancies, extracting
+        them only from the new or changed descriptions."""
+
+        instrumentation = Instrumentation.current()
+        cache = self._cache or self
+        settings = self._extraction_settings()
+        fingerprint = settings_fingerprint(*settings)
+        technologies: list[list[dict[str, Any]] | None] = []
+        stale = []  # Vacancies whose technologies are not cached yet.
+        with instrumentation.stage("cache_lookup"):
+            for vacancy in self._vacancies:
+                hash_ = description_hash(vacancy["description"], *settings)
+                technologies.append(cache.cached_technologies(vacancy, hash_))
+                if technologies[-1] is None:
+                    stale.append((len(technologies) - 1, vacancy, hash_))
+            instrumentation.add("cache_lookup", vacancies=len(technologies))
+
+        entries = []
+        # Producing the counts extracts them, the cleaning is nested in it.
+        counts = instrumentation.timed(
+            "extract",
+            self._count_documents(
+                instrumentation.timed(
+                    "clean",
+                    (
+                        self._clean_text(vacancy["description"])
+                        for _, vacancy, _ in stale
+                    ),
+                )
+            ),
         )
-        pattern = re.compile(rf"{'|'.join(to_filter)}", flags=re.IGNORECASE)
-        self._text = re.sub(pattern, " ", self._text)
+        for (position, vacancy, hash_), (proper_nouns, lower_to_upper) in zip(
+            stale, counts
+        ):
+            entry = VacancyTechnologies(
+                **{field: vacancy[field] for field in self.index_fields()},
+                description_hash=hash_,
+                extraction_fingerprint=fingerprint,
+                technologies=[
+                    TechnologyCount(
+                        name=name, text=lower_to_upper[name], count=count
+                    )
+                    for name, count in proper_nouns.items()
+                ],
+            )
+            technologies[position] = [
+                technology.model_dump() for technology in entry.technologies
+            ]
+            entries.append(entry)
+
+        with instrumentation.stage("save_technologies", items=len(entries)):
+            if cache is self:
+                self.connect_collection()
+                self.save_technologies(entries)
+            else:
+                cache.save_technologies(entries)
+        if cache is self and entries:
+            with instrumentation.stage("refresh_rollups"):
+                rollups = DatabaseTechnologyRollups()
+                rollups.connect_collection()
+                rollups.refresh_rollups(
+                    self._category,
+                    fingerprint,
+                    since=min(entry.publication_date for entry in entries),
+                )
+
+        proper_nouns, lower_to_upper = Counter(), {}
+        for vacancy_technologies in technologies:
+            for technology in vacancy_technologies:
+                proper_nouns[technology["name"]] += technology["count"]
+                lower_to_upper[technology["name"]] = technology["text"]
+        return proper_nouns, lower_to_upper
 
     def extract_text_from_vacancies(
         self,
         from_datetime: timedelta = timedelta(days=30),
         to_datetime: timedelta = timedelta(days=0),
     ) -> None:
+        instrumentation = Instrumentation.current()
         self._from_datetime = from_datetime
         self._to_datetime = to_datetime
+        self._window_end = DatabaseStatistics.window_end(datetime.now(UTC))
         self.connect_collection()
-        vacancies = self.fetch_vacancies(
-            self._category, from_datetime, to_datetime
-        )
-        self._text = " ".join(
-            [vacancy["description"] for vacancy in vacancies]
-        )
-        self.client.close()
+        if self._stream and not self._incremental:
+            # The cursor is consumed (and timed) while extracting.
+            self._texts = (
+                vacancy["description"]
+                for vacancy in instrumentation.timed(
+                    "fetch_vacancies",
+                    self.iter_vacancies(
+                        self._category,
+                        from_datetime,
+                        to_datetime,
+                        now=self._window_end,
+                    ),
+                )
+            )
+            return
+        if self._incremental:
+            self._vacancies = list(
+                instrumentation.timed(
+                    "fetch_vacancies",
+                    self.iter_vacancies(
+                        self._category,
+                        from_datetime,
+                        to_datetime,
+                        fields=[
+                            *self.index_fields(),
+                            "description",
+                            # Only the technologies of the current settings.
+                            self.extraction_field(
+                                self.extraction_fingerprint()
+                            ),
+                        ],
+                        now=self._window_end,
+                    ),
+                )
+            )
+        else:
+            self._text = " ".join(
+                [
+                    vacancy["description"]
+                    for vacancy in instrumentation.timed(
+                        "fetch_vacancies",
+                        self.iter_vacancies(
+                            self._category,
+                            from_datetime,
+                            to_datetime,
+                            now=self._window_end,
+                        ),
+                    )
+                ]
+            )
 
     def calculate_frequency_distribution(
         self, limit_results: int = 20
     ) -> Statistics:
-        if not self._text:
+        if not self._text and self._texts is None and self._vacancies is None:
             self.extract_text_from_vacancies()
-        self._clean_text()
-
-        nlp = spacy.load("en_core_web_sm")  # Load the spaCy model.
-        doc = nlp(self._text)  # Process the text with spaCy.
-
-        # Unicode ranges for English letters.
-        eng_uppercase, eng_lowercase = range(65, 90), range(97, 122)
-
-        proper_nouns, lower_to_upper = [], {}
-        for token in doc:
-            if (
-                token.pos_ == "PROPN"  # IT techs are mostly proper nouns.
-                and (token_text := token.text) not in self._stopwords
-                and (
-                    ord(token_text[0]) in eng_uppercase
-                    or ord(token_text[0]) in eng_lowercase
+
+        instrumentation = Instrumentation.current()
+        if self._vacancies is not None:
+            proper_nouns_count, lower_to_upper = self._count_incrementally()
+        elif self._texts is not None and self._n_process > 1:
+            with instrumentation.stage("extract"):
+                proper_nouns_count, lower_to_upper = self._count_in_parallel(
+                    instrumentation.timed(
+                        "clean", self._normalizer.stream(self._texts)
+                    )
+                )
+        else:
+            if self._texts is not None:
+                # Stream the descriptions through the engine one by one.
+                texts = instrumentation.timed(
+                    "clean", self._normalizer.stream(self._texts)
+                )
+            else:
+                with instrumentation.stage("clean", items=1):
+                    texts = [self._clean_text(self._text)]
+            with instrumentation.stage("extract"):
+                proper_nouns_count, lower_to_upper = count_shard(
+                    texts,
+                    self._stopwords,
+                    self._model,
+                    self._batch_size,
+                    self._engine,
                 )
-            ):
-                proper_nouns.append(token_text.lower())
-                lower_to_upper[token_text.lower()] = token_text
 
-        proper_nouns_count = Counter(proper_nouns)
-        now = datetime.now(UTC)
-        return Statistics(
-            category=self._category,
-            from_datetime=now - self._from_datetime,
-            to_datetime=now - self._to_datetime,
-            technology_frequency={
+        return self._create_statistics(
+            {
                 lower_to_upper[noun_frequency[0]]: noun_frequency[1]
                 for noun_frequency in proper_nouns_count.most_common(
                     limit_results
                 )
-            },
+            }
+        )
+
+    def update_technologies(
+        self,
+        from_datetime: timedelta = timedelta(days=30),
+        to_datetime: timedelta = timedelta(days=0),
+    ) -> int:
+        """Extract and cache the technologies of the vacancies of the
+        window that have none cached with the current settings, and refresh
+        the technology rollups of the category. Return the number of
+        vacancies processed."""
+        self._from_datetime = from_datetime
+        self._to_datetime = to_datetime
+        self.connect_collection()
+        with Instrumentation.current().stage("fetch_vacancies"):
+            self._vacancies = self.fetch_uncached_vacancies(
+                self._category,
+                from_datetime,
+                to_datetime,
+                self.extraction_fingerprint(),
+            )
+        self._count_incrementally()
+        return len(self._vacancies)
+
+    def aggregate_frequency_distribution(
+        self,
+        limit_results: int = 20,
+        from_datetime: timedelta = timedelta(days=30),
+        to_datetime: timedelta = timedelta(days=0),
+    ) -> Statistics:
+        """Calculate the statistics on the MongoDB server.
+
+        Technologies are extracted only from the vacancies that have none
+        cached, then the cached technologies of the window are summed by an
+        aggregation pipeline, so only the top technologies are transferred.
+        """
+        # Up to the current time, only the sum is limited to the window.
+        self.update_technologies(from_datetime, to_datetime)
+        self._window_end = DatabaseStatistics.window_end(datetime.now(UTC))
+        with Instrumentation.current().stage("aggregate"):
+            technology_frequency = self.aggregate_technology_frequency(
+                self._category,
+                from_datetime,
+                to_datetime,
+                self.extraction_fingerprint(),
+                limit_results,
+                now=self._window_end,
+            )
+        return self._create_statistics(technology_frequency)
+
+    def _create_statistics(
+        self, technology_frequency: dict[str, int]
+    ) -> Statistics:
+        from_datetime, to_datetime = DatabaseStatistics.window_bounds(
+            self._window_end or datetime.now(UTC),
+            self._from_datetime,
+            self._to_datetime,
+        )
+        return Statistics(
+            category=self._category,
+            from_datetime=from_datetime,
+            to_datetime=to_datetime,
+            technology_frequency=technology_frequency,
         )
 
     @staticmethod
     def save_statistics(
-        statistics: Statistics, *, to_db: bool = True
-    ) -> BulkWriteResult | Any:
-        if to_db:
-            db = DatabaseStatistics()
-            collection = db.connect_collection()
-            bulk_write_result = collection.bulk_write(
-                db.create_replacements([statistics])
-            )
-            db.client.close()
-            return bulk_write_result
-
-        file = Path(f"{DatabaseStatistics.collection}.csv")
-        file_exists = file.exists()
-        fieldnames = statistics.model_fields.keys()
-        with open(file, "a") as fp:
-            writer = csv.DictWriter(fp, fieldnames=fieldnames)
-            writer.writeheader() if not file_exists else None
-            return writer.writerow(statistics.model_dump())
-
-
-if __name__ == "__main__":
-    CATEGORY = "Python"
-    wrangler = Wrangler(None, CATEGORY)
-    statistics = wrangler.calculate_frequency_distribution()
-    wrangler.save_statistics(statistics)
+        statistics: Statistics,
+        *,
+        to_db: bool = True,
+        file_format: str = "csv",
+    ) -> "BulkWriteResult | Any":
+        """Upsert the statistics of the category and window to MongoDB or
+        append them to a CSV file or the Parquet dataset (`file_format`)."""
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"`file_format` must be one of {FILE_FORMATS}.")
+        with Instrumentation.current().stage("save_statistics", items=1):
+            if to_db:
+                db = DatabaseStatistics()
+                collection = db.connect_collection()
+                return collection.bulk_write(
+                    db.create_replacements([statistics])
+                )
+            if file_format == "parquet":
+                return ParquetStatistics().write([statistics])
+
+            file = Path(f"{DatabaseStatistics.collection}.csv")
+            file_exists = file.exists()
+            fieldnames = statistics.model_fields.keys()
+            with open(file, "a") as fp:
+                writer = csv.DictWriter(fp, fieldnames=fieldnames)
+                writer.writeheader() if not file_exists else None
+                return writer.writerow(statistics.model_dump())
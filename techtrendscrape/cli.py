@@ -0,0 +1,340 @@
+"""Crawl vacancies, calculate and export statistics, or run them on a
+schedule.
+
+Usage (from the project root):
+    python -m techtrendscrape.cli crawl Python "C# / .NET" --delta
+    python -m techtrendscrape.cli stats Python --windows 7 30
+    python -m techtrendscrape.cli export statistics Python --format parquet
+    python -m techtrendscrape.cli daemon --schedule "Python=0 */6 * * *"
+
+Vacancies are stored in MongoDB by default, `--storage csv` or
+`--storage parquet` use the files of `CrawlToCSV` instead. Heavy
+dependencies are imported by the subcommands that need them.
+"""
+
+import argparse
+import logging
+from datetime import timedelta
+
+from scrapy.settings import Settings
+
+from database import Statistics
+from techtrendanalysis.batch import DEFAULT_WINDOWS
+from techtrendanalysis.instrumentation import Instrumentation
+
+STORAGES = ("mongo", "csv", "parquet")
+EXPORT_BATCH_SIZE = 10_000
+
+
+def crawl_settings(
+    categories: list[str], args: argparse.Namespace, *, delta: bool
+) -> Settings:
+    """The project settings writing the vacancies to the `storage`."""
+    from scrapy.utils.project import get_project_settings
+
+    from techtrendscrape.crawler import CrawlToCSV
+
+    if args.storage == "mongo":
+        return get_project_settings()
+    return CrawlToCSV(
+        " | ".join(categories),
+        compression=args.compression,
+        split_by_category=args.split_by_category,
+        delta=delta,
+        file_format=args.storage,
+    ).settings
+
+
+def calculate_statistics(
+    categories: list[str], args: argparse.Namespace, *, save: bool = True
+) -> list[Statistics]:
+    """Calculate the statistics of the `categories` over every window from
+    MongoDB, or over all vacancies of the files.
+
+    In the `incremental` mode, technologies are only extracted from the
+    vacancies that have none cached, see `Wrangler`."""
+    if args.storage == "mongo" and args.incremental:
+        from techtrendanalysis.batch import BatchStatistics
+        from techtrendanalysis.wrangler import Wrangler
+
+        statistics = []
+        for category in categories:
+            wrangler = Wrangler(
+                None,
+                category,
+                batch_size=args.batch_size,
+                n_process=args.n_process,
+                incremental=True,
+                engine=args.engine,
+            )
+            # The widest window extracts the technologies of the new
+            # vacancies, the narrower ones only sum the cached ones.
+            for days in sorted(set(args.windows), reverse=True):
+                statistics.append(
+                    wrangler.aggregate_frequency_distribution(
+                        args.limit, timedelta(days=days)
+                    )
+                )
+        if save:
+            BatchStatistics.save_statistics(statistics)
+        return statistics
+    if args.storage == "mongo":
+        from techtrendanalysis.batch import BatchStatistics
+
+        batch = BatchStatistics(
+            categories,
+            [timedelta(days=days) for days in args.windows],
+            batch_size=args.batch_size,
+            engine=args.engine,
+        )
+        statistics = batch.calculate_frequency_distributions(args.limit)
+        if save:
+            batch.save_statistics(statistics)
+        return statistics
+
+    from techtrendscrape.crawler import CrawlToCSV
+
+    return [
+        CrawlToCSV(
+            category,
+            stream=True,
+            batch_size=args.batch_size,
+            n_process=args.n_process,
+            incremental=args.incremental,
+            compression=args.compression,
+            split_by_category=args.split_by_category,
+            file_format=args.storage,
+            engine=args.engine,
+        ).extract_statistics(save=save, limit_results=args.limit)
+        for category in categories
+    ]
+
+
+def crawl(args: argparse.Namespace) -> None:
+    from scrapy.crawler import CrawlerProcess
+
+    process = CrawlerProcess(
+        crawl_settings(args.categories, args, delta=args.delta)
+    )
+    process.crawl(
+        "djinni",
+        categories=" | ".join(args.categories),
+        delta=args.delta,
+        pagination=args.pagination,
+    )
+    process.start()
+
+
+def stats(args: argparse.Namespace) -> None:
+    statistics = calculate_statistics(
+        args.categories, args, save=not args.dry_run
+    )
+    if args.dry_run:
+        for item in statistics:
+            print(item.model_dump_json())
+    else:
+        print(f"Saved {len(statistics)} statistics.")
+
+
+def export(args: argparse.Namespace) -> None:
+    """Export the vacancies of the window or the latest statistics of the
+    categories from MongoDB to the CSV or Parquet files."""
+    from database import (
+        DatabaseStatistics,
+        DatabaseVacancies,
+        ParquetStatistics,
+        VacancyItem,
+    )
+    from techtrendanalysis.wrangler import Wrangler
+    from techtrendscrape.pipelines import CSVPipeline, ParquetPipeline
+    from techtrendscrape.spiders.djinni import DjinniSpider
+
+    if args.collection == "statistics":
+        db = DatabaseStatistics()
+        db.connect_collection()
+        statistics = db.latest_snapshots(args.categories)
+        if args.format == "parquet":
+            ParquetStatistics().write(statistics)
+        else:
+            for item in statistics:
+                Wrangler.save_statistics(item, to_db=False)
+        print(f"Exported {len(statistics)} statistics.")
+        return
+
+    db = DatabaseVacancies()
+    db.connect_collection()
+    vacancies = db.iter_vacancies(
+        args.categories,
+        timedelta(days=args.days),
+        timedelta(days=0),
+        fields=VacancyItem.model_fields,
+    )
+    exported, spider = 0, DjinniSpider()
+    # Like a crawl, the export replaces the vacancies stored in the files.
+    pipeline: CSVPipeline | ParquetPipeline
+    if args.format == "parquet":
+        pipeline = ParquetPipeline(EXPORT_BATCH_SIZE)
+    else:
+        pipeline = CSVPipeline(args.compression, args.split_by_category)
+        pipeline.open_spider(spider)
+    for vacancy in vacancies:
+        pipeline.process_item(VacancyItem(**vacancy), spider)
+        exported += 1
+    pipeline.close_spider(spider)
+    print(f"Exported {exported} vacancies.")
+
+
+def daemon(args: argparse.Namespace) -> None:
+    from techtrendanalysis.nlp import NLPEngine
+    from techtrendscrape.scheduler import CronSchedule, Daemon
+
+    schedules = {}
+    for item in args.schedule:
+        category, separator, expression = item.rpartition("=")
+        if not separator or not category:
+            raise ValueError(f"Schedule {item!r} is not CATEGORY=CRON.")
+        schedules[category] = CronSchedule(expression)
+
+    # Load the model and open the connection pool once for all the runs.
+    if args.engine == "propn":
+        NLPEngine.warm_up()
+    if args.storage == "mongo":
+        from database import DatabaseVacancies
+
+        DatabaseVacancies().connect_collection()
+
+    settings = crawl_settings(list(schedules), args, delta=True)
+    # The crawl extracts the technologies of the new vacancies with the
+    # engine of the statistics, which then only sum the cached ones.
+    settings.set("MONGO_PIPELINE_TECHNOLOGY_ENGINE", args.engine)
+    Daemon(
+        schedules,
+        settings,
+        lambda category: calculate_statistics([category], args),
+    ).start(run_now=args.now)
+
+
+def main(argv: list[str] | None = None) -> None:
+    from techtrendanalysis.wrangler import ENGINES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    storage = argparse.ArgumentParser(add_help=False)
+    storage.add_argument("--storage", choices=STORAGES, default="mongo")
+    storage.add_argument("--compression", choices=("gzip",))
+    storage.add_argument("--split-by-category", action="store_true")
+
+    statistics = argparse.ArgumentParser(add_help=False)
+    statistics.add_argument(
+        "--windows",
+        nargs="+",
+        type=int,
+        default=DEFAULT_WINDOWS,
+        help="window lengths in days (MongoDB only)",
+    )
+    statistics.add_argument("--limit", type=int, default=20)
+    statistics.add_argument("--engine", choices=ENGINES, default="propn")
+    statistics.add_argument("--batch-size", type=int, default=64)
+    statistics.add_argument(
+        "--n-process",
+        type=int,
+        default=1,
+        help="worker processes extracting the technologies (files or "
+        "--incremental only)",
+    )
+
+    parser_crawl = subparsers.add_parser(
+        "crawl", parents=[storage], help="crawl the categories once"
+    )
+    parser_crawl.add_argument("categories", nargs="+")
+    parser_crawl.add_argument(
+        "--delta",
+        action="store_true",
+        help="only crawl the vacancies newer than the stored ones",
+    )
+    parser_crawl.add_argument(
+        "--pagination", choices=("parallel", "sequential"), default="parallel"
+    )
+    parser_crawl.set_defaults(handler=crawl)
+
+    parser_stats = subparsers.add_parser(
+        "stats",
+        parents=[storage, statistics],
+        help="calculate and save the statistics of the categories",
+    )
+    parser_stats.add_argument("categories", nargs="+")
+    parser_stats.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the statistics instead of saving them",
+    )
+    parser_stats.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only extract the technologies of the vacancies without cached "
+        "ones",
+    )
+    parser_stats.set_defaults(handler=stats)
+
+    parser_export = subparsers.add_parser(
+        "export",
+        help="export vacancies or the latest statistics from MongoDB",
+    )
+    parser_export.add_argument(
+        "collection", choices=("vacancies", "statistics")
+    )
+    parser_export.add_argument("categories", nargs="+")
+    parser_export.add_argument(
+        "--format", choices=("csv", "parquet"), default="csv"
+    )
+    parser_export.add_argument(
+        "--days",
+        type=int,
+        default=30,
+        help="export the vacancies published within the last days",
+    )
+    parser_export.add_argument("--compression", choices=("gzip",))
+    parser_export.add_argument("--split-by-category", action="store_true")
+    parser_export.set_defaults(handler=export)
+
+    parser_daemon = subparsers.add_parser(
+        "daemon",
+        parents=[storage, statistics],
+        help="crawl and calculate statistics on cron schedules (UTC)",
+    )
+    parser_daemon.add_argument(
+        "--schedule",
+        action="append",
+        required=True,
+        metavar="CATEGORY=CRON",
+        help='e.g. "Python=0 */6 * * *", once per category',
+    )
+    parser_daemon.add_argument(
+        "--now", action="store_true", help="also run every category at once"
+    )
+    # The runs only process the vacancies crawled since the last one.
+    parser_daemon.set_defaults(handler=daemon, incremental=True)
+
+    args = parser.parse_args(argv)
+    if args.command in ("stats", "daemon") and args.n_process < 1:
+        parser.error("--n-process must be at least 1")
+    if (
+        args.command == "stats"
+        and args.storage == "mongo"
+        and args.n_process > 1
+        and not args.incremental
+    ):
+        parser.error("--n-process with MongoDB requires --incremental")
+    if args.command == "daemon":
+        # Every scheduled run is instrumented on its own.
+        args.handler(args)
+        return
+    if args.command != "crawl":
+        logging.basicConfig(level=logging.INFO)
+    with Instrumentation.run(args.command):
+        args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
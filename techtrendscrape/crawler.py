@@ -1,10 +1,16 @@
 import csv
+from typing import TYPE_CHECKING, Any, Iterable
 
 from scrapy.crawler import CrawlerProcess
+from scrapy.settings import Settings
 from scrapy.utils.project import get_project_settings
 
-from database import DatabaseVacancies, Statistics
-from techtrendanalysis.wrangler import Wrangler
+from database import DatabaseVacancies, ParquetVacancies, Statistics
+from techtrendanalysis.instrumentation import Instrumentation
+from techtrendscrape.pipelines import CSVPipeline
+
+if TYPE_CHECKING:
+    from techtrendanalysis.wrangler import Wrangler
 
 
 class CrawlToCSV:
@@ -14,45 +20,173 @@ class CrawlToCSV:
     statistics. It is intended for overview use.
     """
 
-    def __init__(self, category: str) -> None:
+    def __init__(
+        self,
+        category: str,
+        *,
+        stream: bool = False,
+        batch_size: int = 64,
+        n_process: int = 1,
+        incremental: bool = False,
+        compression: str | None = None,
+        split_by_category: bool = False,
+        delta: bool = False,
+        file_format: str = "csv",
+        engine: str = "propn",
+    ) -> None:
+        """With `stream` enabled, descriptions are read from the CSV file
+        and processed one by one instead of being merged into one text.
+        More than one `n_process` implies streaming.
+
+        With `incremental` enabled, technologies of every vacancy are cached
+        in a local file, so only new or changed descriptions are processed
+        on the next run.
+
+        `compression` and `split_by_category` configure the files written
+        by the `CSVPipeline`.
+
+        With `delta` enabled, only the vacancies published after the newest
+        one in the CSV file are crawled and appended to it.
+
+        With the "parquet" `file_format`, vacancies and statistics are
+        stored in Parquet datasets partitioned by category and month (see
+        `ParquetVacancies`) instead of CSV files. Only the descriptions of
+        the category are then read back.
+
+        The `engine` extracts the technologies, see `Wrangler`."""
+
+        # The analysis stack is only imported when it is used, a crawl
+        # doesn't need it.
+        from techtrendanalysis.wrangler import FILE_FORMATS
+
+        if file_format not in FILE_FORMATS:
+            raise ValueError(f"`file_format` must be one of {FILE_FORMATS}.")
+
         self._category = category
+        self._stream = stream or n_process > 1
+        self._batch_size = batch_size
+        self._n_process = n_process
+        self._incremental = incremental
+        self._compression = compression
+        self._split_by_category = split_by_category
+        self._delta = delta
+        self._file_format = file_format
+        self._engine = engine
         self._settings = get_project_settings()
-        # Save the results to a CSV file instead of MongoDB.
+        # Save the results to files instead of MongoDB.
         self._settings.update(
             {
                 "ITEM_PIPELINES": {
-                    "techtrendscrape.pipelines.CSVPipeline": 300,
-                }
+                    (
+                        "techtrendscrape.pipelines.ParquetPipeline"
+                        if file_format == "parquet"
+                        else "techtrendscrape.pipelines.CSVPipeline"
+                    ): 300,
+                },
+                "CSV_PIPELINE_COMPRESSION": compression,
+                "CSV_PIPELINE_SPLIT_BY_CATEGORY": split_by_category,
+                "CSV_PIPELINE_APPEND": delta,
+                "PARQUET_PIPELINE_APPEND": delta,
+                "DELTA_CRAWL_SOURCE": file_format,
             }
         )
 
+    @property
+    def settings(self) -> Settings:
+        """The project settings writing the vacancies to the files."""
+        return self._settings
+
     def start(self) -> None:
         """Scrape vacancies from Djinni by the provided category and save to
         `vacancies.csv` file."""
 
         process = CrawlerProcess(self._settings)
-        process.crawl("djinni", categories=self._category)
+        process.crawl("djinni", categories=self._category, delta=self._delta)
         process.start()
 
-    def extract_statistics(self, *, save: bool = True) -> Statistics:
-        """Merge descriptions from the `vacancies.csv`, extract
-        statistics and save it to the `statistics.csv`."""
+    def extract_statistics(
+        self, *, save: bool = True, limit_results: int = 20
+    ) -> Statistics:
+        """Merge descriptions of the category from the `vacancies.csv` (or
+        the Parquet dataset), extract statistics and save it to the
+        `statistics.csv` (or the Parquet dataset)."""
 
-        # Collect vacancy descriptions.
-        with open(f"{DatabaseVacancies.collection}.csv") as csv_file:
-            reader = csv.DictReader(csv_file)
-            descriptions = " ".join([item["description"] for item in reader])
-
-        # Extract statistics from the merged descriptions.
-        wrangler = Wrangler(descriptions, self._category)
-        statistics = wrangler.calculate_frequency_distribution()
+        if self._file_format == "parquet":
+            # Only the columns needed of the partitions of the category
+            # are read.
+            fields = ["description"]
+            if self._incremental:
+                fields += DatabaseVacancies.index_fields()
+            wrangler, statistics = self._calculate(
+                limit_results,
+                Instrumentation.current().timed(
+                    "read_parquet",
+                    ParquetVacancies().iter_vacancies(
+                        self._category, fields=fields
+                    ),
+                ),
+            )
+        else:
+            file = CSVPipeline.file_path(
+                self._category if self._split_by_category else None,
+                self._compression,
+            )
+            with CSVPipeline.open_file(file) as csv_file:
+                vacancies: Iterable[dict[str, Any]] = csv.DictReader(csv_file)
+                if not self._split_by_category:
+                    # The shared file holds the vacancies of every category.
+                    vacancies = (
+                        vacancy
+                        for vacancy in vacancies
+                        if vacancy["category"] == self._category
+                    )
+                wrangler, statistics = self._calculate(
+                    limit_results,
+                    Instrumentation.current().timed("read_csv", vacancies),
+                )
 
         if save:
-            wrangler.save_statistics(statistics, to_db=False)
+            wrangler.save_statistics(
+                statistics, to_db=False, file_format=self._file_format
+            )
+        return statistics
+
+    def _calculate(
+        self, limit_results: int, vacancies: Iterable[dict[str, Any]]
+    ) -> tuple["Wrangler", Statistics]:
+        from techtrendanalysis.cache import TechnologyCache
+        from techtrendanalysis.wrangler import Wrangler
 
+        if self._incremental:
+            cache = TechnologyCache()
+            wrangler = Wrangler(
+                None,
+                self._category,
+                batch_size=self._batch_size,
+                n_process=self._n_process,
+                vacancies=vacancies,
+                cache=cache,
+                engine=self._engine,
+            )
+            statistics = wrangler.calculate_frequency_distribution(
+                limit_results
+            )
+            cache.close()
+            return wrangler, statistics
 
-if __name__ == "__main__":
-    CATEGORY = "Python"
-    crawler = CrawlToCSV(CATEGORY)
-    crawler.start()
-    crawler.extract_statistics()
+        descriptions = (vacancy["description"] for vacancy in vacancies)
+        if not self._stream:
+            # Merge vacancy descriptions.
+            descriptions = " ".join(descriptions)
+
+        # Extract statistics from the descriptions.
+        wrangler = Wrangler(
+            descriptions,
+            self._category,
+            batch_size=self._batch_size,
+            n_process=self._n_process,
+            engine=self._engine,
+        )
+        return wrangler, wrangler.calculate_frequency_distribution(
+            limit_results
+        )
@@ -0,0 +1,62 @@
+from time import perf_counter
+
+from scrapy import Spider, signals
+from scrapy.crawler import Crawler
+from scrapy.statscollectors import StatsCollector
+
+from techtrendanalysis.instrumentation import Instrumentation, rss_mb
+
+
+class InstrumentationExtension:
+    """Record the crawl in the current `Instrumentation` run.
+
+    The "crawl" stage gets the wall time of the whole crawl (including the
+    pipeline stages, e.g. "csv_write"), the pages and items counted by the
+    Scrapy stats and the growth of the RSS. The stages recorded during the crawl
+    are copied to the Scrapy stats as `instrumentation/<stage>/<metric>`.
+    A crawl started outside of a run (e.g. by `scrapy crawl`) gets its own
+    run, exported when the spider is closed.
+    """
+
+    def __init__(self, stats: StatsCollector) -> None:
+        self._stats = stats
+        self._instrumentation: Instrumentation | None = None
+        self._owns_run = False
+        self._started = 0.0
+        self._rss = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> "InstrumentationExtension":
+        extension = cls(crawler.stats)
+        crawler.signals.connect(
+            extension.spider_opened, signal=signals.spider_opened
+        )
+        crawler.signals.connect(
+            extension.spider_closed, signal=signals.spider_closed
+        )
+        return extension
+
+    def spider_opened(self, spider: Spider) -> None:
+        self._owns_run = not Instrumentation.active()
+        if self._owns_run:
+            Instrumentation.start(f"crawl_{spider.name}")
+        self._instrumentation = Instrumentation.current()
+        self._started = perf_counter()
+        self._rss = rss_mb()
+
+    def spider_closed(self, spider: Spider) -> None:
+        instrumentation = self._instrumentation
+        instrumentation.add(
+            "crawl",
+            perf_counter() - self._started,
+            pages=self._stats.get_value("response_received_count", 0),
+            items=self._stats.get_value("item_scraped_count", 0),
+            rss_growth_mb=rss_mb() - self._rss,
+        )
+        for name, stage in instrumentation.to_dict()["stages"].items():
+            for metric, value in stage.items():
+                self._stats.set_value(
+                    f"instrumentation/{name}/{metric}", value
+                )
+        if self._owns_run:
+            instrumentation.finish()
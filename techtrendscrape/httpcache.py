@@ -0,0 +1,153 @@
+import logging
+import pickle
+import sqlite3
+import zlib
+from pathlib import Path
+from time import time
+
+from scrapy import Spider
+from scrapy.http import Headers, Request, Response
+from scrapy.responsetypes import responsetypes
+from scrapy.settings import BaseSettings
+from scrapy.utils.project import data_path
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCacheStorage:
+    """HTTP cache storage keeping compressed responses in one SQLite file.
+
+    Unlike the `FilesystemCacheStorage`, which writes several uncompressed
+    files per response and never deletes them, the cache is bounded by
+    `HTTPCACHE_SQLITE_MAX_SIZE` bytes of compressed responses: the least
+    recently used ones are evicted first.
+    """
+
+    def __init__(self, settings: BaseSettings) -> None:
+        self.cachedir = data_path(settings["HTTPCACHE_DIR"], createdir=True)
+        self.expiration_secs = settings.getint("HTTPCACHE_EXPIRATION_SECS")
+        self.max_size = settings.getint(
+            "HTTPCACHE_SQLITE_MAX_SIZE", 256 * 1024**2
+        )
+        self.compression_level = settings.getint(
+            "HTTPCACHE_SQLITE_COMPRESSION_LEVEL", 6
+        )
+        self._connection: sqlite3.Connection | None = None
+        self._size = 0  # Total size of the stored responses.
+
+    def open_spider(self, spider: Spider) -> None:
+        path = Path(self.cachedir, f"{spider.name}.sqlite")
+        # Statements are committed at once, WAL keeps the writes cheap.
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        # Freed pages are returned to the file system after evictions.
+        self._connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "fingerprint BLOB PRIMARY KEY, "
+            "data BLOB NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "stored_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at "
+            "ON responses (accessed_at)"
+        )
+        if self.expiration_secs > 0:
+            self._connection.execute(
+                "DELETE FROM responses WHERE stored_at < ?",
+                (time() - self.expiration_secs,),
+            )
+        self._size = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        self._evict()
+
+        logger.debug(
+            "Using SQLite cache storage in %(cachepath)s",
+            {"cachepath": path},
+            extra={"spider": spider},
+        )
+
+        self._fingerprinter = spider.crawler.request_fingerprinter
+
+    def close_spider(self, spider: Spider) -> None:
+        self._connection.close()
+
+    def retrieve_response(
+        self, spider: Spider, request: Request
+    ) -> Response | None:
+        fingerprint = self._fingerprinter.fingerprint(request)
+        row = self._connection.execute(
+            "SELECT data, stored_at FROM responses WHERE fingerprint = ?",
+            (fingerprint,),
+        ).fetchone()
+        if row is None:
+            return None  # Not cached.
+        data, stored_at = row
+        if 0 < self.expiration_secs < time() - stored_at:
+            return None  # Expired.
+        self._connection.execute(
+            "UPDATE responses SET accessed_at = ? WHERE fingerprint = ?",
+            (time(), fingerprint),
+        )
+
+        data = pickle.loads(zlib.decompress(data))
+        url = data["url"]
+        status = data["status"]
+        headers = Headers(data["headers"])
+        body = data["body"]
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(
+        self, spider: Spider, request: Request, response: Response
+    ) -> None:
+        fingerprint = self._fingerprinter.fingerprint(request)
+        data = zlib.compress(
+            pickle.dumps(
+                {
+                    "status": response.status,
+                    "url": response.url,
+                    "headers": dict(response.headers),
+                    "body": response.body,
+                },
+                protocol=4,
+            ),
+            self.compression_level,
+        )
+        replaced = self._connection.execute(
+            "SELECT size FROM responses WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        now = time()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (fingerprint, data, len(data), now, now),
+        )
+        self._size += len(data) - (replaced[0] if replaced else 0)
+        if self._size > self.max_size:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Delete the least recently used responses until the cache takes
+        at most 90% of the maximum size, so that evictions are batched."""
+        if self._size <= self.max_size:
+            return
+        target = self.max_size * 0.9
+        evicted = []
+        for fingerprint, size in self._connection.execute(
+            "SELECT fingerprint, size FROM responses ORDER BY accessed_at"
+        ).fetchall():
+            if self._size <= target:
+                break
+            evicted.append((fingerprint,))
+            self._size -= size
+        self._connection.execute("BEGIN")
+        self._connection.executemany(
+            "DELETE FROM responses WHERE fingerprint = ?", evicted
+        )
+        self._connection.execute("COMMIT")
+        self._connection.execute("PRAGMA incremental_vacuum")
+        logger.debug("Evicted %d responses from the HTTP cache", len(evicted))
@@ -7,32 +7,386 @@
 # useful for handling different item types with a single interface
 
 import csv
+import gzip
+import logging
+import re
+from datetime import UTC, datetime
+from pathlib import Path
+from time import perf_counter
+from typing import IO, TYPE_CHECKING, Iterable
 
-from database import DatabaseVacancies, VacancyItem
-from techtrendscrape.spiders.djinni import DjinniSpider
+from scrapy.crawler import Crawler
+from scrapy.statscollectors import StatsCollector
+from twisted.internet.defer import Deferred, DeferredList
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
+from twisted.python.failure import Failure
+
+from database import (
+    DatabaseVacancies,
+    NewestVacancies,
+    ParquetVacancies,
+    VacancyItem,
+)
+from techtrendanalysis.instrumentation import Instrumentation
+
+if TYPE_CHECKING:
+    from pymongo.collection import Collection
+
+    from techtrendscrape.spiders.djinni import DjinniSpider
+
+logger = logging.getLogger(__name__)
 
 
 class MongoPipeline(DatabaseVacancies):
-    def __init__(self) -> None:
+    """Write vacancies to MongoDB in batches while crawling.
+
+    A batch is flushed every `MONGO_PIPELINE_BATCH_SIZE` items or every
+    `MONGO_PIPELINE_FLUSH_INTERVAL` seconds. Writes run in a thread, so
+    they don't stall the reactor, and a crash loses at most one batch.
+    Once `MONGO_PIPELINE_MAX_PENDING_FLUSHES` batches are being written,
+    items are held until one of them is done, so a slow database slows
+    down the crawl instead of queueing batches in memory.
+
+    With a `MONGO_PIPELINE_TECHNOLOGY_ENGINE`, the technologies of the
+    written vacancies are extracted and cached when the spider closes,
+    which also refreshes the technology rollups of their categories.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval: float = 10.0,
+        stats: StatsCollector | None = None,
+        max_pending_flushes: int = 2,
+        technology_engine: str | None = None,
+    ) -> None:
         super().__init__()
+        if max_pending_flushes < 1:
+            raise ValueError("`max_pending_flushes` must be positive.")
         self.items: list[VacancyItem] = []
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_pending_flushes = max_pending_flushes
+        self._technology_engine = technology_engine
+        # Publication date of the oldest vacancy written per category.
+        self._oldest_dates: dict[str, datetime] = {}
+        self._stats = stats
+        self._collection: "Collection | None" = None
+        self._flush_loop = LoopingCall(self._flush)
+        self._pending_flushes: set[Deferred] = set()
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> "MongoPipeline":
+        return cls(
+            batch_size=crawler.settings.getint(
+                "MONGO_PIPELINE_BATCH_SIZE", 500
+            ),
+            flush_interval=crawler.settings.getfloat(
+                "MONGO_PIPELINE_FLUSH_INTERVAL", 10.0
+            ),
+            stats=crawler.stats,
+            max_pending_flushes=crawler.settings.getint(
+                "MONGO_PIPELINE_MAX_PENDING_FLUSHES", 2
+            ),
+            technology_engine=crawler.settings.get(
+                "MONGO_PIPELINE_TECHNOLOGY_ENGINE"
+            ),
+        )
+
+    def open_spider(self, spider: "DjinniSpider") -> None:
+        self._collection = self.connect_collection()
+        self._flush_loop.start(self._flush_interval, now=False)
 
-    def close_spider(self, spider: DjinniSpider) -> None:
-        collection = self.connect_collection()
-        collection.bulk_write(self.create_replacements(self.items))
-        self.client.close()
+    def close_spider(self, spider: "DjinniSpider") -> DeferredList:
+        if self._flush_loop.running:
+            self._flush_loop.stop()
+        self._flush()
+        # Scrapy waits for the remaining writes before closing the spider.
+        closed = DeferredList(list(self._pending_flushes))
+        if self._technology_engine is not None and self._oldest_dates:
+            closed.addCallback(
+                lambda _: deferToThread(self._update_technologies)
+            )
+            closed.addErrback(self._log_failed_update)
+        return closed
 
     def process_item(
-        self, item: VacancyItem, spider: DjinniSpider
-    ) -> VacancyItem:
+        self, item: VacancyItem, spider: "DjinniSpider"
+    ) -> VacancyItem | Deferred:
         self.items.append(item)
+        oldest = self._oldest_dates.get(item.category)
+        if oldest is None or item.publication_date < oldest:
+            self._oldest_dates[item.category] = item.publication_date
+        if len(self.items) >= self._batch_size:
+            self._flush()
+        if len(self._pending_flushes) < self._max_pending_flushes:
+            return item
+        # Scrapy doesn't feed the pipeline more items than its scraper slot
+        # holds while this one is waiting for a write to finish.
+        if self._stats is not None:
+            self._stats.inc_value("mongo_pipeline/backpressure_waits")
+        waiting = DeferredList(
+            list(self._pending_flushes), fireOnOneCallback=True
+        )
+        return waiting.addCallback(lambda _: item)
+
+    def _flush(self) -> None:
+        if not self.items:
+            return
+        batch, self.items = self.items, []
+        flush = deferToThread(self._write, batch)
+        self._pending_flushes.add(flush)
+        flush.addCallbacks(
+            self._record_flush,
+            self._log_failed_flush,
+            callbackArgs=(len(batch),),
+            errbackArgs=(len(batch),),
+        )
+        flush.addBoth(lambda _: self._pending_flushes.discard(flush))
+
+    def _write(self, batch: list[VacancyItem]) -> float:
+        """Write the `batch` (in a thread) and return the write latency."""
+        started = perf_counter()
+        self._collection.bulk_write(self.create_upserts(batch), ordered=False)
+        return perf_counter() - started
+
+    def _update_technologies(self) -> None:
+        """Extract the technologies of the vacancies published since the
+        day of the oldest written one of each category (in a thread)."""
+        from techtrendanalysis.wrangler import Wrangler
+
+        now = datetime.now(UTC).replace(tzinfo=None)
+        for category, oldest in self._oldest_dates.items():
+            # A whole day (the smallest rollup bucket), as the stored dates
+            # are rounded to milliseconds.
+            since = oldest.replace(hour=0, minute=0, second=0, microsecond=0)
+            wrangler = Wrangler(None, category, engine=self._technology_engine)
+            updated = wrangler.update_technologies(from_datetime=now - since)
+            if self._stats is not None:
+                self._stats.inc_value(
+                    "mongo_pipeline/technologies_extracted", updated
+                )
+
+    def _log_failed_update(self, failure: Failure) -> None:
+        logger.error(
+            "Failed to extract the technologies of the crawled vacancies",
+            exc_info=(
+                failure.type,
+                failure.value,
+                failure.getTracebackObject(),
+            ),
+        )
+
+    def _record_flush(self, latency: float, batch_size: int) -> None:
+        Instrumentation.current().add(
+            "mongo_write", latency, calls=1, items=batch_size
+        )
+        if self._stats is None:
+            return
+        self._stats.inc_value("mongo_pipeline/flushes")
+        self._stats.inc_value("mongo_pipeline/items_written", batch_size)
+        self._stats.inc_value("mongo_pipeline/flush_latency_total", latency)
+        self._stats.max_value("mongo_pipeline/flush_latency_max", latency)
+        self._stats.max_value("mongo_pipeline/batch_size_max", batch_size)
+
+    def _log_failed_flush(self, failure: Failure, batch_size: int) -> None:
+        logger.error(
+            "Failed to write %d vacancies to MongoDB",
+            batch_size,
+            exc_info=(
+                failure.type,
+                failure.value,
+                failure.getTracebackObject(),
+            ),
+        )
+        if self._stats is not None:
+            self._stats.inc_value("mongo_pipeline/failed_flushes")
+
+
+class CSVPipeline:
+    """Write vacancies to a CSV file as they arrive.
+
+    The file is optionally gzipped (`CSV_PIPELINE_COMPRESSION = "gzip"`) or
+    split into one file per category (`CSV_PIPELINE_SPLIT_BY_CATEGORY`).
+    Memory usage doesn't grow with the crawl, and the rows written so far
+    survive an interrupted crawl. With `CSV_PIPELINE_APPEND` (e.g. for a
+    delta crawl), rows are appended to the existing files.
+    """
+
+    collection = DatabaseVacancies.collection
+    fieldnames = list(VacancyItem.model_fields)
+    buffer_size = 1 << 16
+
+    def __init__(
+        self,
+        compression: str | None = None,
+        split_by_category: bool = False,
+        append: bool = False,
+    ) -> None:
+        if compression not in (None, "gzip"):
+            raise ValueError(f"Unsupported compression: {compression}.")
+        self._compression = compression
+        self._split_by_category = split_by_category
+        self._append = append
+        self._files: dict[str | None, tuple[IO[str], csv.DictWriter]] = {}
+        # Time spent and rows written, recorded once when closing.
+        self._write_seconds = 0.0
+        self._written = 0
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> "CSVPipeline":
+        return cls(
+            compression=crawler.settings.get("CSV_PIPELINE_COMPRESSION"),
+            split_by_category=crawler.settings.getbool(
+                "CSV_PIPELINE_SPLIT_BY_CATEGORY"
+            ),
+            append=crawler.settings.getbool("CSV_PIPELINE_APPEND"),
+        )
+
+    @classmethod
+    def file_path(
+        cls, category: str | None = None, compression: str | None = None
+    ) -> Path:
+        """Path of the file with the vacancies of the `category` (or of all
+        categories if the file is not split)."""
+        name = cls.collection
+        if category is not None:
+            name += (
+                "-" + re.sub(r"[^\w+#.]+", "-", category).strip("-").lower()
+            )
+        return Path(f"{name}.csv{'.gz' if compression == 'gzip' else ''}")
+
+    @classmethod
+    def open_file(cls, path: Path, mode: str = "r") -> IO[str]:
+        """Open a plain or gzipped CSV file in text mode."""
+        if path.suffix == ".gz":
+            return gzip.open(path, f"{mode}t", newline="")
+        return open(path, mode, newline="", buffering=cls.buffer_size)
+
+    @classmethod
+    def newest_vacancies(
+        cls,
+        categories: Iterable[str],
+        compression: str | None = None,
+        split_by_category: bool = False,
+    ) -> dict[str, NewestVacancies]:
+        """The newest vacancies per category stored in the CSV
+        file(s)."""
+        categories = set(categories)
+        files = [
+            cls.file_path(category, compression)
+            for category in (categories if split_by_category else [None])
+        ]
+        newest: dict[str, NewestVacancies] = {}
+        for file in files:
+            if not file.exists():
+                continue
+            with cls.open_file(file) as fp:
+                for row in csv.DictReader(fp):
+                    if (category := row["category"]) not in categories:
+                        continue
+                    date = datetime.fromisoformat(row["publication_date"])
+                    newest.setdefault(
+                        category, NewestVacancies(publication_date=date)
+                    ).add(
+                        date,
+                        (
+                            row["company_name"],
+                            int(row["years_of_experience"]),
+                        ),
+                    )
+        return newest
+
+    def _writer(self, category: str | None) -> csv.DictWriter:
+        if category not in self._files:
+            path = self.file_path(category, self._compression)
+            append = self._append and path.exists() and path.stat().st_size
+            fp = self.open_file(path, "a" if append else "w")
+            writer = csv.DictWriter(fp, fieldnames=self.fieldnames)
+            if not append:
+                writer.writeheader()
+            self._files[category] = fp, writer
+        return self._files[category][1]
+
+    def open_spider(self, spider: "DjinniSpider") -> None:
+        if not self._split_by_category:
+            self._writer(None)
+
+    def close_spider(self, spider: "DjinniSpider") -> None:
+        started = perf_counter()
+        for fp, _ in self._files.values():
+            fp.close()
+        self._files.clear()
+        Instrumentation.current().add(
+            "csv_write",
+            self._write_seconds + perf_counter() - started,
+            items=self._written,
+            calls=1,
+        )
+        self._write_seconds, self._written = 0.0, 0
+
+    def process_item(
+        self, item: VacancyItem, spider: "DjinniSpider"
+    ) -> VacancyItem:
+        category = item.category if self._split_by_category else None
+        started = perf_counter()
+        self._writer(category).writerow(item.model_dump())
+        self._write_seconds += perf_counter() - started
+        self._written += 1
         return item
 
 
-class CSVPipeline(MongoPipeline):
-    def close_spider(self, spider: DjinniSpider) -> None:
-        fieldnames = VacancyItem.model_fields.keys()
-        with open(f"{self.collection}.csv", "w") as fp:
-            writer = csv.DictWriter(fp, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows([item.model_dump() for item in self.items])
+class ParquetPipeline:
+    """Write vacancies to a Parquet dataset partitioned by category and
+    publication month (see `ParquetVacancies`).
+
+    Vacancies are written in batches of `PARQUET_PIPELINE_BATCH_SIZE`
+    items. Like the CSV file, the stored vacancies of a partition are
+    replaced by the first batch written to it, unless
+    `PARQUET_PIPELINE_APPEND` is set (e.g. for a delta crawl).
+    """
+
+    def __init__(self, batch_size: int = 10_000, append: bool = False) -> None:
+        self._dataset = ParquetVacancies()
+        self._batch_size = batch_size
+        self._append = append
+        self._written: set[tuple[str, str]] = set()  # Replaced partitions.
+        self.items: list[VacancyItem] = []
+
+    @classmethod
+    def from_crawler(cls, crawler: Crawler) -> "ParquetPipeline":
+        return cls(
+            batch_size=crawler.settings.getint(
+                "PARQUET_PIPELINE_BATCH_SIZE", 10_000
+            ),
+            append=crawler.settings.getbool("PARQUET_PIPELINE_APPEND"),
+        )
+
+    def close_spider(self, spider: "DjinniSpider") -> None:
+        self._flush()
+        self._written.clear()
+
+    def process_item(
+        self, item: VacancyItem, spider: "DjinniSpider"
+    ) -> VacancyItem:
+        self.items.append(item)
+        if len(self.items) >= self._batch_size:
+            self._flush()
+        return item
+
+    def _flush(self) -> None:
+        batch, self.items = self.items, []
+        with Instrumentation.current().stage(
+            "parquet_write", items=len(batch)
+        ):
+            if self._append:
+                self._dataset.write(batch)
+                return
+            new, written = [], []
+            for item in batch:
+                partition = self._dataset.partition(item)
+                (written if partition in self._written else new).append(item)
+            self._dataset.write(written)
+            self._dataset.write(new, replace=True)
+            self._written.update(map(self._dataset.partition, new))
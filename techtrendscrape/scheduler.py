@@ -0,0 +1,188 @@
+import logging
+from datetime import UTC, datetime, timedelta
+from typing import Any, Callable
+
+from scrapy.settings import Settings
+from twisted.internet.defer import Deferred, DeferredLock
+from twisted.python.failure import Failure
+
+from techtrendanalysis.instrumentation import Instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class CronSchedule:
+    """A cron expression: minute, hour, day of month, month and day of week
+    (0 or 7 is Sunday), evaluated in UTC.
+
+    A field is `*`, a value, a range (`1-5`), a step (`*/15`, `0-30/10`) or
+    a comma-separated list of them.
+    """
+
+    fields = (
+        ("minute", 0, 59),
+        ("hour", 0, 23),
+        ("day", 1, 31),
+        ("month", 1, 12),
+        ("weekday", 0, 7),
+    )
+
+    def __init__(self, expression: str) -> None:
+        parts = expression.split()
+        if len(parts) != len(self.fields):
+            raise ValueError(
+                f"Cron expression {expression!r} must have "
+                f"{len(self.fields)} fields."
+            )
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(part, low, high)
+            for part, (_, low, high) in zip(parts, self.fields)
+        )
+        self.weekdays = frozenset(weekday % 7 for weekday in weekdays)
+        # As in cron, restricted days of month and of week add up.
+        self._any_day = parts[2].startswith("*")
+        self._any_weekday = parts[4].startswith("*")
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> frozenset[int]:
+        values = set()
+        for item in field.split(","):
+            range_, _, step = item.partition("/")
+            try:
+                if range_ == "*":
+                    start, stop = low, high
+                elif "-" in range_:
+                    start, stop = map(int, range_.split("-"))
+                else:
+                    start = stop = int(range_)
+                step_ = int(step or 1)
+            except ValueError:
+                raise ValueError(f"Invalid cron field {field!r}.") from None
+            if step and "-" not in range_ and range_ != "*":
+                stop = high  # `5/15` means from 5 to the end every 15.
+            if not low <= start <= stop <= high or step_ < 1:
+                raise ValueError(f"Invalid cron field {field!r}.")
+            values.update(range(start, stop + 1, step_))
+        return frozenset(values)
+
+    def _matches_day(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first time after the `moment` the schedule fires."""
+        moment = moment.astimezone(UTC).replace(second=0, microsecond=0)
+        moment += timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 4)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1) + timedelta(days=32)).replace(
+                    day=1, hour=0, minute=0
+                )
+            elif not self._matches_day(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression {self.expression!r} never fires.")
+
+
+class Daemon:
+    """Crawl categories and calculate their statistics on cron schedules
+    in a single long-running process.
+
+    The crawls share one Twisted reactor through a `CrawlerRunner`, which,
+    unlike a `CrawlerProcess`, can be run any number of times. The jobs
+    run one at a time: a delta crawl of the category followed by the
+    `calculate_statistics` callable in a thread, so the spaCy model and
+    the MongoDB connection pool loaded by the first job stay warm for the
+    next ones. A job whose previous run is still pending is skipped.
+    """
+
+    def __init__(
+        self,
+        schedules: dict[str, CronSchedule],
+        settings: Settings,
+        calculate_statistics: Callable[[str], Any],
+    ) -> None:
+        if not schedules:
+            raise ValueError("At least one category must be scheduled.")
+        self._schedules = schedules
+        self._settings = settings
+        self._calculate_statistics = calculate_statistics
+        self._lock = DeferredLock()
+        self._pending: set[str] = set()
+        self._runner: Any = None
+
+    def start(self, *, run_now: bool = False) -> None:
+        """Schedule the jobs (and run them at once with `run_now`) and run
+        the reactor until the process is stopped."""
+        from scrapy.crawler import CrawlerRunner
+        from scrapy.utils.log import configure_logging
+        from scrapy.utils.reactor import install_reactor
+
+        install_reactor(self._settings["TWISTED_REACTOR"])
+        from twisted.internet import reactor
+
+        configure_logging(self._settings)
+        self._runner = CrawlerRunner(self._settings)
+        for category in self._schedules:
+            if run_now:
+                reactor.callLater(0, self._run, category)
+            self._schedule(category)
+        reactor.run()
+
+    def _schedule(self, category: str) -> None:
+        from twisted.internet import reactor
+
+        now = datetime.now(UTC)
+        next_run = self._schedules[category].next_after(now)
+        reactor.callLater(
+            (next_run - now).total_seconds(), self._fire, category
+        )
+        logger.info("Next run of %s at %s", category, next_run)
+
+    def _fire(self, category: str) -> None:
+        self._schedule(category)
+        self._run(category)
+
+    def _run(self, category: str) -> None:
+        if category in self._pending:
+            logger.warning("Skipping %s, its last run is pending", category)
+            return
+        self._pending.add(category)
+        job = self._lock.run(self._job, category)
+        job.addErrback(self._log_failed_job, category)
+        job.addBoth(lambda _: self._pending.discard(category))
+
+    def _job(self, category: str) -> Deferred:
+        from twisted.internet.threads import deferToThread
+
+        job = self._runner.crawl("djinni", categories=category, delta=True)
+        job.addCallback(
+            lambda _: deferToThread(self._statistics_job, category)
+        )
+        return job
+
+    def _statistics_job(self, category: str) -> None:
+        with Instrumentation.run(f"statistics_{category}"):
+            self._calculate_statistics(category)
+
+    @staticmethod
+    def _log_failed_job(failure: Failure, category: str) -> None:
+        logger.error(
+            "Scheduled run of %s failed",
+            category,
+            exc_info=(
+                failure.type,
+                failure.value,
+                failure.getTracebackObject(),
+            ),
+        )
@@ -58,15 +58,38 @@ ROBOTSTXT_OBEY = False
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    # Stage timings and peak memory, see `techtrendanalysis.instrumentation`.
+    "techtrendscrape.extensions.InstrumentationExtension": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     "techtrendscrape.pipelines.MongoPipeline": 300,
 }
+# Write vacancies to MongoDB every N items or every T seconds.
+MONGO_PIPELINE_BATCH_SIZE = 500
+MONGO_PIPELINE_FLUSH_INTERVAL = 10
+# Batches written at once before the pipeline holds new items.
+MONGO_PIPELINE_MAX_PENDING_FLUSHES = 2
+# Extract the technologies of the written vacancies with this engine
+# ("propn" or "lexicon") when the crawl ends, refreshing the technology
+# rollups. None leaves it to the statistics runs, so a crawl doesn't load
+# the analysis stack (the daemon sets the engine of its statistics).
+MONGO_PIPELINE_TECHNOLOGY_ENGINE = None
+# Gzip the CSV file ("gzip") and/or write one CSV file per category.
+CSV_PIPELINE_COMPRESSION = None
+CSV_PIPELINE_SPLIT_BY_CATEGORY = False
+# Append to the existing CSV files instead of overwriting them.
+CSV_PIPELINE_APPEND = False
+# Write vacancies to the Parquet dataset every N items.
+PARQUET_PIPELINE_BATCH_SIZE = 10_000
+# Append to the existing Parquet partitions instead of replacing them.
+PARQUET_PIPELINE_APPEND = False
+# Where a delta crawl (`-a delta=true`) looks up the newest stored vacancy
+# of each category: "mongo", "csv" or "parquet".
+DELTA_CRAWL_SOURCE = "mongo"
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -81,13 +104,31 @@ ITEM_PIPELINES = {
 # Enable showing throttling stats for every response received:
 # AUTOTHROTTLE_DEBUG = False
 
+# Crawl profile for djinni.co. The spider requests all listing pages of a
+# category at once, so the concurrency (not the pagination) bounds the load
+# on the site. All requests go to a single domain, at most 8 of them in
+# parallel. AutoThrottle targets 4 parallel requests, which keep the
+# latency of the light listing pages flat, and lowers the concurrency if
+# responses slow down. The download delay is the lower bound of its delay.
+CONCURRENT_REQUESTS = 16
+CONCURRENT_REQUESTS_PER_DOMAIN = 8
+DOWNLOAD_DELAY = 0.25
+AUTOTHROTTLE_ENABLED = True
+AUTOTHROTTLE_START_DELAY = 1
+AUTOTHROTTLE_MAX_DELAY = 30
+AUTOTHROTTLE_TARGET_CONCURRENCY = 4.0
+
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
 HTTPCACHE_ENABLED = True
 HTTPCACHE_EXPIRATION_SECS = timedelta(hours=3).seconds
 HTTPCACHE_DIR = "httpcache"
 HTTPCACHE_IGNORE_HTTP_CODES = []
-HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# Compressed responses in a single SQLite file, the least recently used
+# ones are evicted beyond the maximum size (in bytes).
+HTTPCACHE_STORAGE = "techtrendscrape.httpcache.SQLiteCacheStorage"
+HTTPCACHE_SQLITE_MAX_SIZE = 256 * 1024**2
+HTTPCACHE_SQLITE_COMPRESSION_LEVEL = 6
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
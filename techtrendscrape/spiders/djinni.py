@@ -1,68 +1,196 @@
+import re
 from datetime import datetime
+from functools import lru_cache
 from typing import Any, Generator, Iterable
-from urllib.parse import quote_plus, unquote_plus
+from urllib.parse import quote_plus
 
 import scrapy
+from lxml.etree import XPath
+from parsel.csstranslator import HTMLTranslator
+from pydantic import TypeAdapter
 from scrapy.http import Request, Response
+from w3lib.url import add_or_replace_parameter
 
-from database import VacancyItem
+from database import (
+    DatabaseVacancies,
+    NewestVacancies,
+    ParquetVacancies,
+    VacancyItem,
+)
+from techtrendscrape.pipelines import CSVPipeline
+
+
+def _compile(css: str) -> XPath:
+    """Translate the CSS selector to XPath and compile it once."""
+    return XPath(HTMLTranslator().css_to_xpath(css))
+
+
+# Selectors of a listing page, the ones of a job item are relative to it.
+JOB_ITEMS = _compile("ul .list-jobs__item")
+JOB_INFO = _compile(".job-list-item__job-info span::text")
+COMPANY_NAME = _compile("header a.mr-2::text")
+DESCRIPTION = _compile(
+    ".job-list-item__description span::attr(data-original-text)"
+)
+PUBLICATION_DATE = _compile("span.text-muted span.mr-2.nobr::attr(title)")
+STATISTICS = _compile("span.text-muted span.nobr .mr-2::attr(title)")
+EXPERIENCE = re.compile(r"\b(\d+)\b")
+VACANCY_ITEMS = TypeAdapter(list[VacancyItem])
+
+
+@lru_cache(maxsize=4096)
+def parse_publication_date(text: str) -> datetime:
+    """Parse the publication date, vacancies of the same minute share the
+    (immutable) result."""
+    return datetime.strptime(text, "%H:%M %d.%m.%Y")
+
+
+def _first(values: list[str]) -> str | None:
+    return str(values[0]) if values else None
 
 
 class DjinniSpider(scrapy.Spider):
     """Pass any number of categories as a string separated by a `" | "`.
     For example `"C# / .NET | Python"`. The category name can be
     found on the Djinni website.
+
+    With the "parallel" `pagination` (default), the number of pages of a
+    category is read from the first listing page and the remaining pages
+    are requested at once, so they are downloaded concurrently within the
+    limits of the crawl settings. Pass `-a pagination=sequential` to follow
+    the "next page" links one by one.
+
+    With `-a delta=true`, only the vacancies published after the newest
+    stored one of the category are scraped, read from MongoDB or from the
+    CSV file (`DELTA_CRAWL_SOURCE`). Pages are followed one by one and the
+    crawl of a category stops at the first page without new vacancies.
     """
 
     name = "djinni"
     allowed_domains = ["djinni.co"]
     start_urls = ["https://djinni.co/jobs/"]
     categories = "Python"
+    pagination = "parallel"
+    pagination_modes = ("parallel", "sequential")
+    delta = False
 
     def start_requests(self) -> Iterable[Request]:
+        if self.pagination not in self.pagination_modes:
+            raise ValueError(
+                f"`pagination` must be one of {self.pagination_modes}."
+            )
+        self.delta = str(self.delta).lower() in ("1", "true", "yes")
+        categories = self.categories.split(" | ")
+        self._newest_vacancies = (
+            self._stored_newest_vacancies(categories) if self.delta else {}
+        )
         for url in self.start_urls:
-            for primary_keyword in self.categories.split(" | "):
+            for primary_keyword in categories:
                 yield Request(
                     f"{url}?primary_keyword={quote_plus(primary_keyword)}",
                     dont_filter=True,
+                    cb_kwargs={"category": primary_keyword},
                 )
 
-    def _parse_job_item(
-        self, selector: scrapy.Selector, category: str
-    ) -> VacancyItem:
-        years_of_experience, company_type = 0, None
-        for job_info in selector.css(".job-list-item__job-info span::text"):
-            if experience := job_info.re(r"\b(\d+)\b"):
-                years_of_experience = int(experience[0])
-            if "Product" in job_info.get():
-                company_type = "Product"
-        statistics = selector.css(
-            "span.text-muted span.nobr .mr-2::attr(title)"
-        )
-        return VacancyItem(
-            source=self.name,
-            category=category,
-            company_name=selector.css("header a.mr-2::text").get().strip(),
-            company_type=company_type or "Outsource/staff",
-            description=selector.css(
-                ".job-list-item__description span::attr(data-original-text)"
-            ).get(),
-            years_of_experience=years_of_experience,
-            publication_date=datetime.strptime(
-                selector.css(
-                    "span.text-muted span.mr-2.nobr::attr(title)"
-                ).get(),
-                "%H:%M %d.%m.%Y",
-            ),
-            views=int(statistics[0].get().split()[0]),
-            applications=int(statistics[1].get().split()[0]),
-        )
+    def _parse_job_items(
+        self, response: Response, category: str
+    ) -> list[VacancyItem]:
+        """Extract the vacancies of a listing page with the precompiled
+        XPaths and validate them at once."""
+        vacancies = []
+        for job_item in JOB_ITEMS(response.selector.root):
+            years_of_experience, company_type = 0, None
+            for job_info in JOB_INFO(job_item):
+                if experience := EXPERIENCE.search(job_info):
+                    years_of_experience = int(experience[1])
+                if "Product" in job_info:
+                    company_type = "Product"
+            statistics = STATISTICS(job_item)
+            # Strings are copied, XPath results reference the whole page.
+            vacancies.append(
+                {
+                    "source": self.name,
+                    "category": category,
+                    "company_name": str(COMPANY_NAME(job_item)[0]).strip(),
+                    "company_type": company_type or "Outsource/staff",
+                    "description": _first(DESCRIPTION(job_item)),
+                    "years_of_experience": years_of_experience,
+                    "publication_date": parse_publication_date(
+                        str(PUBLICATION_DATE(job_item)[0])
+                    ),
+                    "views": int(statistics[0].split()[0]),
+                    "applications": int(statistics[1].split()[0]),
+                }
+            )
+        return VACANCY_ITEMS.validate_python(vacancies)
 
-    def parse(self, response: Response) -> Generator[VacancyItem, Any, None]:
-        category = unquote_plus(
-            response.request.url.split("=")[1].split("&")[0]
+    def _stored_newest_vacancies(
+        self, categories: list[str]
+    ) -> dict[str, NewestVacancies]:
+        source = self.settings.get("DELTA_CRAWL_SOURCE", "mongo")
+        if source == "parquet":
+            return ParquetVacancies().newest_vacancies(categories)
+        if source == "csv":
+            return CSVPipeline.newest_vacancies(
+                categories,
+                compression=self.settings.get("CSV_PIPELINE_COMPRESSION"),
+                split_by_category=self.settings.getbool(
+                    "CSV_PIPELINE_SPLIT_BY_CATEGORY"
+                ),
+            )
+        db = DatabaseVacancies()
+        db.connect_collection()
+        return db.newest_vacancies(categories)
+
+    @staticmethod
+    def _last_page(response: Response, page: int) -> int:
+        """The highest page number linked by the pagination."""
+        numbers = response.css(".pagination a::attr(href)").re(
+            r"[?&]page=(\d+)"
         )
-        for job_item in response.css("ul .list-jobs__item"):
-            yield self._parse_job_item(job_item, category)
-        if next_page := response.css(".pagination li.active + li a"):
-            yield response.follow(next_page[0], callback=self.parse)
+        return max(map(int, numbers), default=page)
+
+    def parse(
+        self,
+        response: Response,
+        category: str,
+        page: int = 1,
+        last_page: int | None = None,
+    ) -> Generator[VacancyItem | Request, Any, None]:
+        newest = self._newest_vacancies.get(category)
+        new_vacancies = 0
+        for item in self._parse_job_items(response, category):
+            if newest is not None and newest.is_known(item):
+                continue  # Already stored.
+            new_vacancies += 1
+            yield item
+        if not (next_page := response.css(".pagination li.active + li a")):
+            return
+        if newest is not None and not new_vacancies:
+            # Vacancies are listed newest first, the next pages are known.
+            self.logger.info(
+                "Reached known %s vacancies on page %d", category, page
+            )
+            return
+        if self.pagination == "parallel" and not self.delta and page == 1:
+            last_page = max(self._last_page(response, page), page + 1)
+            for number in range(page + 1, last_page + 1):
+                yield Request(
+                    add_or_replace_parameter(
+                        response.url, "page", str(number)
+                    ),
+                    callback=self.parse,
+                    cb_kwargs={
+                        "category": category,
+                        "page": number,
+                        "last_page": last_page,
+                    },
+                )
+        elif last_page is None or page >= last_page:
+            # The pagination may not link the last page, keep following
+            # the "next page" links past the scheduled pages.
+            yield response.follow(
+                next_page[0],
+                callback=self.parse,
+                cb_kwargs={"category": category, "page": page + 1},
+            )
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.templates import Database
+
+
+def _date_trunc(parser, values):
+    """The `$dateTrunc` units used by the rollups, which mongomock lacks."""
+    date = parser.parse(values["date"])
+    date = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    if values["unit"] == "week":
+        assert values.get("startOfWeek") == "monday"
+        return date - timedelta(days=date.weekday())
+    assert values["unit"] == "day"
+    return date
+
+
+def _merge(in_collection, database, options):
+    """The `$merge` options used by the rollups, which mongomock lacks."""
+    assert (options["whenMatched"], options["whenNotMatched"]) == (
+        "replace",
+        "insert",
+    )
+    into = database.get_collection(options["into"])
+    for document in in_collection:
+        document = {k: v for k, v in document.items() if k != "_id"}
+        into.replace_one(
+            {field: document[field] for field in options["on"]},
+            document,
+            upsert=True,
+        )
+    return []
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Connect the database templates to an in-memory mongomock client."""
+    mongomock = pytest.importorskip("mongomock")
+    from mongomock import aggregate
+
+    client = mongomock.MongoClient()
+    monkeypatch.setenv("IS_TEST", "true")
+    monkeypatch.setattr(
+        "database.client.MongoClientSingleton", lambda **kwargs: client
+    )
+    monkeypatch.setattr(Database, "_indexed_collections", set())
+
+    handle_date_operator = aggregate._Parser._handle_date_operator
+    monkeypatch.setattr(
+        aggregate, "date_operators", [*aggregate.date_operators, "$dateTrunc"]
+    )
+    monkeypatch.setattr(
+        aggregate._Parser,
+        "_handle_date_operator",
+        lambda parser, operator, values: (
+            _date_trunc(parser, values)
+            if operator == "$dateTrunc"
+            else handle_date_operator(parser, operator, values)
+        ),
+    )
+    monkeypatch.setitem(aggregate._PIPELINE_HANDLERS, "$merge", _merge)
+    return client
+
+
+@pytest.fixture
+def now() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=1)
@@ -0,0 +1,57 @@
+import pytest
+
+from techtrendanalysis.matcher import TechnologyMatcher
+
+LEXICON = [
+    {"name": "Ruby"},
+    {"name": "Ruby on Rails", "case_sensitive": True},
+    {"name": "Go", "case_sensitive": True},
+    {"name": "Node.js", "aliases": ["Node"]},
+    {"name": "PostgreSQL", "aliases": ["Postgres"]},
+    {"name": "Linux"},
+]
+
+
+@pytest.fixture
+def matcher():
+    return TechnologyMatcher(LEXICON)
+
+
+def counts(matcher, text):
+    technologies, lower_to_upper = matcher.count(text)
+    return {
+        lower_to_upper[name]: count for name, count in technologies.items()
+    }
+
+
+def test_longest_term_wins_over_case_sensitivity(matcher):
+    assert counts(matcher, "Ruby on Rails and ruby") == {
+        "Ruby on Rails": 1,
+        "Ruby": 1,
+    }
+
+
+def test_case_sensitive_term(matcher):
+    assert counts(matcher, "Go, not go") == {"Go": 1}
+
+
+def test_aliases_count_under_canonical_name(matcher):
+    assert counts(matcher, "NODE.JS, node and postgres") == {
+        "Node.js": 2,
+        "PostgreSQL": 1,
+    }
+
+
+@pytest.mark.parametrize("text", ["PoſtgreSQL", "POſTGRES"])
+def test_unicode_case_folds(matcher, text):
+    assert counts(matcher, text) == {"PostgreSQL": 1}
+
+
+def test_case_match_casefold_disagrees_with(matcher):
+    assert counts(matcher, "Lınux and LİNUX") == {"Linux": 2}
+
+
+def test_bundled_lexicon():
+    assert counts(TechnologyMatcher.get(), "Ruby on Rails") == {
+        "Ruby on Rails": 1
+    }
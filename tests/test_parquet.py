@@ -0,0 +1,83 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from database import ParquetStatistics, ParquetVacancies, Statistics
+from database.models import VacancyItem
+from techtrendscrape.pipelines import ParquetPipeline
+
+pytest.importorskip("pyarrow")
+
+CATEGORIES = ["Python", "Java"]
+
+
+@pytest.fixture(autouse=True)
+def datasets_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def vacancies(count: int) -> list[VacancyItem]:
+    # Weekly vacancies spanning two months of both categories.
+    return [
+        VacancyItem(
+            category=category,
+            company_name=f"Company {i}",
+            company_type=None,
+            description="Python and Django",
+            years_of_experience=1,
+            publication_date=datetime(2024, 3, 20) - timedelta(days=7 * i),
+            views=None,
+            applications=None,
+        )
+        for i in range(count)
+        for category in CATEGORIES
+    ]
+
+
+def crawl(items: list[VacancyItem], **kwargs) -> None:
+    pipeline = ParquetPipeline(batch_size=3, **kwargs)
+    for item in items:
+        pipeline.process_item(item, None)
+    pipeline.close_spider(None)
+
+
+def stored() -> list[tuple[str, str]]:
+    return sorted(
+        (row["category"], row["company_name"])
+        for row in ParquetVacancies().iter_vacancies(
+            CATEGORIES, fields=["category", "company_name"]
+        )
+    )
+
+
+def test_crawl_rerun_replaces_stored_vacancies():
+    crawl(vacancies(6))
+    first = stored()
+    crawl(vacancies(6))
+    assert len(first) == 12
+    assert stored() == first
+
+
+def test_append_keeps_stored_vacancies():
+    crawl(vacancies(2))
+    crawl(vacancies(1), append=True)
+    assert len(stored()) == 6
+
+
+def statistics(from_day: int, frequency: dict[str, int]) -> Statistics:
+    return Statistics(
+        category="Python",
+        from_datetime=datetime(2024, 3, from_day, tzinfo=UTC),
+        to_datetime=datetime(2024, 3, 20, tzinfo=UTC),
+        technology_frequency=frequency,
+    )
+
+
+def test_statistics_replace_the_window():
+    dataset = ParquetStatistics()
+    dataset.write([statistics(13, {"Python": 1}), statistics(1, {"Go": 1})])
+    dataset.write([statistics(13, {"Python": 2})])
+    assert sorted(
+        (item.from_datetime.day, item.technology_frequency)
+        for item in dataset.iter_statistics("Python")
+    ) == [(1, {"Go": 1}), (13, {"Python": 2})]
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import DatabaseTechnologyRollups, DatabaseVacancies
+from database.models import VacancyItem
+from techtrendanalysis.wrangler import Wrangler
+
+WINDOW = timedelta(days=30)
+
+
+@pytest.fixture
+def vacancies(mongo, now):
+    # Two vacancies today and one a week earlier.
+    items = [
+        VacancyItem(
+            category="Python",
+            company_name=f"Company {i}",
+            company_type=None,
+            description=description,
+            years_of_experience=1,
+            publication_date=now - timedelta(days=days),
+            views=None,
+            applications=None,
+        )
+        for i, (days, description) in enumerate(
+            [
+                (0, "Python and Django"),
+                (0, "Python, PostgreSQL"),
+                (7, "Python"),
+            ]
+        )
+    ]
+    db = DatabaseVacancies()
+    db.connect_collection().bulk_write(db.create_upserts(items))
+    return items
+
+
+def wrangler(**kwargs) -> Wrangler:
+    return Wrangler(None, "Python", engine="lexicon", **kwargs)
+
+
+def buckets(fingerprint, granularity):
+    rollups = DatabaseTechnologyRollups()
+    collection = rollups.connect_collection()
+    return {
+        (rollup["bucket"], rollup["text"]): rollup["count"]
+        for rollup in collection.find(
+            {
+                "category": "Python",
+                "extraction_fingerprint": fingerprint,
+                "granularity": granularity,
+            }
+        )
+    }
+
+
+def midnight(date: datetime) -> datetime:
+    return date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def test_refresh_rollups_buckets(vacancies, now):
+    extraction = wrangler()
+    assert extraction.update_technologies(WINDOW) == 3
+
+    fingerprint = extraction.extraction_fingerprint()
+    today, week_ago = midnight(now), midnight(now - timedelta(days=7))
+    assert buckets(fingerprint, "day") == {
+        (today, "Python"): 2,
+        (today, "Django"): 1,
+        (today, "PostgreSQL"): 1,
+        (week_ago, "Python"): 1,
+    }
+    monday = today - timedelta(days=today.weekday())
+    previous_monday = monday - timedelta(days=7)
+    assert buckets(fingerprint, "week") == {
+        (monday, "Python"): 2,
+        (monday, "Django"): 1,
+        (monday, "PostgreSQL"): 1,
+        (previous_monday, "Python"): 1,
+    }
+    rollups = DatabaseTechnologyRollups()
+    rollups.connect_collection()
+    assert rollups.technology_frequency(
+        "Python", fingerprint, week_ago, today
+    ) == {"Python": 3, "Django": 1, "PostgreSQL": 1}
+
+
+def test_rollups_are_kept_apart_per_fingerprint(vacancies, now):
+    today = midnight(now)
+    first, second = wrangler(), wrangler(extra_filters={"Django"})
+    assert first.update_technologies(WINDOW) == 3
+    assert second.update_technologies(WINDOW) == 3
+    # Neither settings extract the technologies again nor lose their rollups.
+    assert first.update_technologies(WINDOW) == 0
+    assert second.update_technologies(WINDOW) == 0
+
+    first_buckets = buckets(first.extraction_fingerprint(), "day")
+    second_buckets = buckets(second.extraction_fingerprint(), "day")
+    assert first_buckets[today, "Django"] == 1
+    assert (today, "Django") not in second_buckets
+    assert second_buckets[today, "Python"] == 2
@@ -0,0 +1,76 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from database import DatabaseStatistics, DatabaseVacancies
+from database.models import VacancyItem
+from techtrendanalysis.batch import BatchStatistics
+from techtrendanalysis.wrangler import Wrangler
+
+WINDOW = timedelta(days=30)
+
+
+@pytest.fixture
+def vacancies(mongo, now):
+    # One vacancy yesterday and one today, after the end of the window.
+    items = [
+        VacancyItem(
+            category="Python",
+            company_name=f"Company {i}",
+            company_type=None,
+            description=description,
+            years_of_experience=1,
+            publication_date=publication_date,
+            views=None,
+            applications=None,
+        )
+        for i, (publication_date, description) in enumerate(
+            [(now - timedelta(days=1), "Python"), (now, "Python and Go")]
+        )
+    ]
+    db = DatabaseVacancies()
+    db.connect_collection().bulk_write(db.create_upserts(items))
+    return items
+
+
+def batch_statistics():
+    batch = BatchStatistics(["Python"], [WINDOW], engine="lexicon")
+    (statistics,) = batch.calculate_frequency_distributions()
+    return statistics
+
+
+def aggregated_statistics():
+    wrangler = Wrangler(None, "Python", engine="lexicon")
+    return wrangler.aggregate_frequency_distribution(from_datetime=WINDOW)
+
+
+def incremental_statistics():
+    wrangler = Wrangler(None, "Python", engine="lexicon", incremental=True)
+    wrangler.extract_text_from_vacancies(WINDOW)
+    return wrangler.calculate_frequency_distribution()
+
+
+@pytest.mark.parametrize(
+    "calculate",
+    [batch_statistics, aggregated_statistics, incremental_statistics],
+)
+def test_statistics_cover_their_stored_window(vacancies, now, calculate):
+    statistics = calculate()
+
+    end = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    assert statistics.to_datetime == end.replace(tzinfo=UTC)
+    assert statistics.from_datetime == (end - WINDOW).replace(tzinfo=UTC)
+    assert statistics.technology_frequency == {"Python": 1}
+
+
+def test_window_bounds_are_stable_within_a_day():
+    morning = datetime(2024, 3, 5, 8, 30, tzinfo=UTC)
+    evening = morning.replace(hour=23, minute=59)
+    bounds = DatabaseStatistics.window_bounds(morning, WINDOW, timedelta(0))
+    assert bounds == DatabaseStatistics.window_bounds(
+        evening, WINDOW, timedelta(0)
+    )
+    assert bounds == (
+        datetime(2024, 2, 4, tzinfo=UTC),
+        datetime(2024, 3, 5, tzinfo=UTC),
+    )